@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     '''Конфиг приложения core'''
     name = 'core'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+
+
+def user_cache_key(user_id):
+    return f'user:{user_id}'
+
+
+def get_user(request):
+    '''
+    Пользователь запроса, как django.contrib.auth.get_user, но из кэша.
+    При промахе пользователь читается из базы стандартным способом
+    и кладется в кэш. Хеш пароля в сессии проверяется и для
+    пользователя из кэша: после смены пароля другие сессии
+    завершаются (кэш сбрасывается при сохранении, core.signals).
+    '''
+    user_id = request.session.get(auth.SESSION_KEY)
+    if (
+        user_id is None
+        or request.session.get(auth.BACKEND_SESSION_KEY)
+        not in settings.AUTHENTICATION_BACKENDS
+    ):
+        return auth.get_user(request)
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = auth.get_user(request)
+        if user.is_authenticated:
+            cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+        return user
+    session_hash = request.session.get(auth.HASH_SESSION_KEY)
+    if not (session_hash and constant_time_compare(
+        session_hash, user.get_session_auth_hash()
+    )):
+        request.session.flush()
+        return AnonymousUser()
+    return user
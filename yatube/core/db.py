@@ -0,0 +1,44 @@
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+
+def apply_pragmas(sqlite_connection, pragmas):
+    '''Настройка соединения sqlite3 (PRAGMA действуют до его закрытия).'''
+    for name, value in pragmas.items():
+        sqlite_connection.execute(f'PRAGMA {name} = {value}')
+
+
+def is_locked(error):
+    '''Ошибка занятости базы другим пишущим соединением.'''
+    return 'locked' in str(error) or 'busy' in str(error)
+
+
+def backoff(attempt):
+    '''Пауза перед повтором: растет вдвое, со случайным разбросом.'''
+    return settings.SQLITE_RETRY_BACKOFF * 2 ** attempt * random.uniform(
+        0.5, 1.5
+    )
+
+
+def atomic_retry(func, *args, **kwargs):
+    '''
+    Вызов func в транзакции с повтором, если база занята дольше
+    таймаута соединения. Повторяется вся транзакция, поэтому внутри
+    уже открытой транзакции ошибка передается наружу.
+    '''
+    attempts = settings.SQLITE_WRITE_RETRIES
+    for attempt in range(attempts + 1):
+        try:
+            with transaction.atomic():
+                return func(*args, **kwargs)
+        except OperationalError as error:
+            if (
+                attempt == attempts
+                or connection.in_atomic_block
+                or not is_locked(error)
+            ):
+                raise
+        time.sleep(backoff(attempt))
@@ -0,0 +1,141 @@
+import json
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .db import atomic_retry
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def _create(**fields):
+    try:
+        with transaction.atomic():
+            Job.objects.create(**fields)
+    except IntegrityError:
+        # Такая же задача (по key) уже ждет в очереди
+        pass
+
+
+def enqueue(func, *args, queue='default', key=None, max_attempts=None,
+            **kwargs):
+    '''
+    Постановка вызова func(*args, **kwargs) в очередь queue после
+    фиксации текущей транзакции: обработчик (run_jobs) не увидит
+    задачу раньше данных, которые она обрабатывает. Аргументы должны
+    сериализоваться в JSON. При JOB_QUEUE = False функция вызывается
+    в процессе запроса, но тоже после фиксации транзакции.
+    '''
+    if not settings.JOB_QUEUE:
+        transaction.on_commit(lambda: func(*args, **kwargs))
+        return
+    if queue not in settings.JOB_QUEUES:
+        raise ValueError(f'Неизвестная очередь задач: {queue}')
+    fields = {
+        'queue': queue,
+        'name': f'{func.__module__}.{func.__qualname__}',
+        'payload': json.dumps([args, kwargs]),
+        'key': key,
+        'max_attempts': max_attempts or settings.JOB_MAX_ATTEMPTS,
+    }
+    transaction.on_commit(lambda: atomic_retry(_create, **fields))
+
+
+def _next_job(queues, now):
+    '''Первая готовая задача из очередей queues, где есть место.'''
+    running = dict(Job.objects.filter(
+        status=Job.RUNNING, run_at__gt=now
+    ).values_list('queue').annotate(count=Count('id')))
+    free = [
+        queue for queue in queues
+        if running.get(queue, 0) < settings.JOB_QUEUES[queue]
+    ]
+    if not free:
+        return None
+    return Job.objects.filter(
+        queue__in=free,
+        status__in=(Job.PENDING, Job.RUNNING),
+        run_at__lte=now
+    ).order_by('run_at', 'id').first()
+
+
+def _claim(queues, now):
+    # Каждый проход меняет состояние кандидата (отметка о неудаче или
+    # запуск другим обработчиком), поэтому следующий берет другую задачу
+    while True:
+        job = _next_job(queues, now)
+        if job is None:
+            return None
+        if job.status == Job.RUNNING and job.attempts >= job.max_attempts:
+            Job.objects.filter(id=job.id, status=Job.RUNNING).update(
+                status=Job.FAILED,
+                last_error='Обработчик не завершил последнюю попытку'
+            )
+            continue
+        claimed = Job.objects.filter(
+            id=job.id, status=job.status, attempts=job.attempts
+        ).update(
+            status=Job.RUNNING,
+            attempts=F('attempts') + 1,
+            run_at=now + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+        )
+        if claimed:
+            job.status = Job.RUNNING
+            job.attempts += 1
+            return job
+
+
+def claim(queues=None):
+    '''
+    Следующая готовая задача из очередей queues (по умолчанию - всех
+    JOB_QUEUES) с отметкой о запуске или None. Очередь, в которой
+    уже выполняется столько задач, сколько указано в JOB_QUEUES,
+    пропускается - ограничение общее для всех обработчиков. Задача
+    пропавшего обработчика запускается заново после JOB_LEASE_SECONDS.
+    '''
+    queues = [
+        queue for queue in settings.JOB_QUEUES
+        if queues is None or queue in queues
+    ]
+    # Проверка занятости очередей и отметка - одна транзакция
+    return atomic_retry(_claim, queues, timezone.now())
+
+
+def _retry(job, error):
+    '''Повтор с паузой, растущей вдвое, или отметка о неудаче.'''
+    if job.attempts >= job.max_attempts:
+        atomic_retry(Job.objects.filter(id=job.id).update,
+                     status=Job.FAILED, last_error=error)
+        return
+    delay = settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+    try:
+        atomic_retry(
+            Job.objects.filter(id=job.id).update,
+            status=Job.PENDING,
+            last_error=error,
+            run_at=timezone.now() + timedelta(seconds=delay)
+        )
+    except IntegrityError:
+        # Пока задача выполнялась, в очередь встала такая же
+        atomic_retry(Job.objects.filter(id=job.id).delete)
+
+
+def run(job):
+    '''Выполнение задачи. Возвращает True, если она завершилась успешно.'''
+    try:
+        func = import_string(job.name)
+        args, kwargs = json.loads(job.payload)
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Задача %s (%s) завершилась ошибкой', job.id, job)
+        _retry(job, traceback.format_exc())
+        return False
+    atomic_retry(Job.objects.filter(id=job.id).delete)
+    return True
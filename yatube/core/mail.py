@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+from . import jobs
+
+
+def send_message(message):
+    '''Задача: отправка письма через JOB_EMAIL_BACKEND.'''
+    alternatives = message.pop('alternatives')
+    email = EmailMultiAlternatives(
+        connection=get_connection(settings.JOB_EMAIL_BACKEND), **message
+    )
+    for content, mimetype in alternatives:
+        email.attach_alternative(content, mimetype)
+    email.send()
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    '''
+    Письма ставятся в очередь задач 'mail' и отправляются обработчиком
+    (run_jobs) через JOB_EMAIL_BACKEND, а не во время запроса.
+    Вложения не поддерживаются: в проекте их нет.
+    '''
+
+    def send_messages(self, email_messages):
+        for message in email_messages:
+            if message.attachments:
+                raise ValueError('Письма с вложениями не ставятся в очередь')
+            jobs.enqueue(send_message, {
+                'subject': message.subject,
+                'body': message.body,
+                'from_email': message.from_email,
+                'to': message.to,
+                'cc': message.cc,
+                'bcc': message.bcc,
+                'reply_to': message.reply_to,
+                'headers': message.extra_headers,
+                'alternatives': getattr(message, 'alternatives', []),
+            }, queue='mail')
+        return len(email_messages)
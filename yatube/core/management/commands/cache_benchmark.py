@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+BACKENDS = (
+    ('locmem', 'django.core.cache.backends.locmem.LocMemCache', ''),
+    ('filebased', 'django.core.cache.backends.filebased.FileBasedCache',
+     'filebased'),
+    ('sqlite', 'core.sqlite_cache.SQLiteCache', 'cache.sqlite3'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает скорость общего кэша SQLite '
+        'с LocMemCache и FileBasedCache.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--operations', type=int, default=5000,
+            help='Количество операций каждого вида'
+        )
+        parser.add_argument(
+            '--value-size', type=int, default=2048,
+            help='Размер значения в байтах'
+        )
+
+    def handle(self, *args, **options):
+        operations = options['operations']
+        value = 'x' * options['value_size']
+        directory = tempfile.mkdtemp()
+        try:
+            self.stdout.write(
+                f'{"backend":<10} {"set/s":>10} {"get/s":>10} '
+                f'{"get_many/s":>10} {"incr/s":>10}'
+            )
+            for name, backend, location in BACKENDS:
+                cache = import_string(backend)(
+                    os.path.join(directory, location) if location else name,
+                    {'OPTIONS': {'MAX_ENTRIES': operations * 2}}
+                )
+                results = self.run(cache, operations, value)
+                self.stdout.write(
+                    f'{name:<10} ' + ' '.join(
+                        f'{rate:>10.0f}' for rate in results
+                    )
+                )
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def run(self, cache, operations, value):
+        keys = [f'key:{number}' for number in range(operations)]
+        rates = []
+
+        start = time.perf_counter()
+        for key in keys:
+            cache.set(key, value)
+        rates.append(operations / (time.perf_counter() - start))
+
+        start = time.perf_counter()
+        for key in keys:
+            cache.get(key)
+        rates.append(operations / (time.perf_counter() - start))
+
+        start = time.perf_counter()
+        for number in range(0, operations, 10):
+            cache.get_many(keys[number:number + 10])
+        rates.append(operations / (time.perf_counter() - start))
+
+        cache.set('counter', 0)
+        start = time.perf_counter()
+        for _ in range(operations):
+            cache.incr('counter')
+        rates.append(operations / (time.perf_counter() - start))
+        return rates
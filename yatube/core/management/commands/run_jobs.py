@@ -0,0 +1,71 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Обработчик фоновых задач (core.jobs): несколько потоков берут '
+        'готовые задачи из базы с учетом ограничений очередей '
+        '(JOB_QUEUES). Обработчиков можно запустить несколько.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=2,
+            help='Сколько задач выполнять одновременно'
+        )
+        parser.add_argument(
+            '--queue', action='append', dest='queues',
+            help='Брать задачи только из этой очереди (можно несколько)'
+        )
+        parser.add_argument(
+            '--poll', type=float, default=1,
+            help='Пауза в секундах, когда готовых задач нет'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options['queues'] or ()) - set(settings.JOB_QUEUES)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные очереди: {", ".join(sorted(unknown))}'
+            )
+        self.results = {True: 0, False: 0}
+        self.lock = threading.Lock()
+        threads = [
+            threading.Thread(target=self.work, args=(options,), daemon=True)
+            for _ in range(options['workers'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.stdout.write(
+            f'Выполнено задач: {self.results[True]}, '
+            f'с ошибкой: {self.results[False]}'
+        )
+
+    def work(self, options):
+        try:
+            while True:
+                close_old_connections()
+                job = jobs.claim(options['queues'])
+                if job is None:
+                    if options['once']:
+                        return
+                    time.sleep(options['poll'])
+                    continue
+                done = jobs.run(job)
+                with self.lock:
+                    self.results[done] += 1
+        finally:
+            connection.close()
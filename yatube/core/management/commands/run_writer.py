@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import writer
+
+
+class Command(BaseCommand):
+    help = (
+        'Пишущий процесс (core.writer): фиксирует записи из запросов '
+        'всех процессов сервера пачками одной транзакцией. Нужен при '
+        'WRITE_QUEUE = True, запускается один.'
+    )
+
+    def handle(self, *args, **options):
+        if not settings.WRITE_QUEUE:
+            raise CommandError('Очередь записей выключена (WRITE_QUEUE)')
+        writer.serve()
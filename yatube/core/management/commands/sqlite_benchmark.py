@@ -0,0 +1,184 @@
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.db import apply_pragmas, backoff, is_locked
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, '
+    'comments_count INTEGER NOT NULL)',
+    'CREATE TABLE comment (id INTEGER PRIMARY KEY, '
+    'post_id INTEGER NOT NULL, text TEXT NOT NULL, '
+    'pub_date REAL NOT NULL)',
+    'CREATE INDEX comment_post ON comment (post_id, pub_date)',
+)
+
+# Настройки до изменений: журнал по умолчанию, таймаут sqlite3 (5 с),
+# без повторов записи; после - как у рабочего соединения
+MODES = {
+    'default': ({}, 5, 0),
+    'tuned': (
+        settings.SQLITE_PRAGMAS,
+        settings.DATABASES['default'].get('OPTIONS', {}).get('timeout', 5),
+        settings.SQLITE_WRITE_RETRIES,
+    ),
+}
+
+
+def connect(path, mode):
+    pragmas, timeout, _ = MODES[mode]
+    connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    apply_pragmas(connection, pragmas)
+    return connection
+
+
+def read(connection, posts):
+    '''Страница записи: комментарии и их количество.'''
+    post_id = random.randint(1, posts)
+    connection.execute(
+        'SELECT id, text FROM comment WHERE post_id = ? '
+        'ORDER BY pub_date DESC LIMIT 10', (post_id,)
+    ).fetchall()
+    connection.execute(
+        'SELECT comments_count FROM post WHERE id = ?', (post_id,)
+    ).fetchone()
+
+
+def write(connection, posts):
+    '''Комментарий и счетчик записи одной транзакцией, как в AddComment.'''
+    post_id = random.randint(1, posts)
+    connection.execute('BEGIN')
+    try:
+        connection.execute(
+            'INSERT INTO comment (post_id, text, pub_date) VALUES (?, ?, ?)',
+            (post_id, 'x' * 200, time.time())
+        )
+        connection.execute(
+            'UPDATE post SET comments_count = comments_count + 1 '
+            'WHERE id = ?', (post_id,)
+        )
+        connection.execute('COMMIT')
+    except sqlite3.OperationalError:
+        connection.execute('ROLLBACK')
+        raise
+
+
+def worker(path, mode, kind, posts, start, deadline):
+    '''
+    Операции одного процесса с start до deadline (одновременно во всех
+    процессах): количество успешных, ошибок и задержки.
+    '''
+    retries = MODES[mode][2]
+    connection = connect(path, mode)
+    operation = read if kind == 'read' else write
+    time.sleep(max(0, start - time.time()))
+    done = failed = 0
+    latencies = []
+    while time.time() < deadline:
+        started = time.perf_counter()
+        for attempt in range(retries + 1):
+            try:
+                operation(connection, posts)
+                done += 1
+                break
+            except sqlite3.OperationalError as error:
+                if not is_locked(error) or attempt == retries:
+                    failed += 1
+                    break
+                time.sleep(backoff(attempt))
+        latencies.append(time.perf_counter() - started)
+    connection.close()
+    return done, failed, latencies
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность SQLite при одновременных '
+        'чтениях и записях в нескольких процессах: настройки по '
+        'умолчанию и SQLITE_PRAGMAS с таймаутом и повтором записи.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument(
+            '--seconds', type=float, default=5,
+            help='Длительность каждого замера'
+        )
+        parser.add_argument(
+            '--posts', type=int, default=10_000,
+            help='Количество записей, комментариев - в 10 раз больше'
+        )
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        try:
+            self.stdout.write(
+                f'{"режим":<8} {"чтений/с":>9} {"записей/с":>10} '
+                f'{"ошибок":>7} {"p99 чтения, мс":>15} '
+                f'{"p99 записи, мс":>15}'
+            )
+            for mode in MODES:
+                path = os.path.join(directory, f'{mode}.sqlite3')
+                self.fill(path, mode, options['posts'])
+                self.compare(path, mode, options)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def fill(self, path, mode, posts):
+        connection = connect(path, mode)
+        for statement in SCHEMA:
+            connection.execute(statement)
+        connection.execute('BEGIN')
+        connection.executemany(
+            'INSERT INTO post (id, comments_count) VALUES (?, 10)',
+            ((number,) for number in range(1, posts + 1))
+        )
+        connection.executemany(
+            'INSERT INTO comment (post_id, text, pub_date) VALUES (?, ?, ?)',
+            (
+                (number % posts + 1, 'x' * 200, number)
+                for number in range(posts * 10)
+            )
+        )
+        connection.execute('COMMIT')
+        connection.close()
+
+    def compare(self, path, mode, options):
+        kinds = ['read'] * options['readers'] + ['write'] * options['writers']
+        # Процессам дается секунда на запуск
+        start = time.time() + 1
+        deadline = start + options['seconds']
+        with ProcessPoolExecutor(max_workers=len(kinds)) as executor:
+            futures = [
+                (kind, executor.submit(
+                    worker, path, mode, kind, options['posts'], start,
+                    deadline
+                ))
+                for kind in kinds
+            ]
+            results = {'read': [0, 0, []], 'write': [0, 0, []]}
+            for kind, future in futures:
+                done, failed, latencies = future.result()
+                results[kind][0] += done
+                results[kind][1] += failed
+                results[kind][2] += latencies
+        seconds = options['seconds']
+        p99 = {
+            kind: sorted(latencies)[int(len(latencies) * 0.99)] * 1000
+            if latencies else 0
+            for kind, (_, _, latencies) in results.items()
+        }
+        self.stdout.write(
+            f'{mode:<8} {results["read"][0] / seconds:>9.0f} '
+            f'{results["write"][0] / seconds:>10.0f} '
+            f'{results["read"][1] + results["write"][1]:>7} '
+            f'{p99["read"]:>15.1f} {p99["write"]:>15.1f}'
+        )
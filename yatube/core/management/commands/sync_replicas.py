@@ -0,0 +1,52 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.db import apply_pragmas
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файлы реплик '
+        '(REPLICA_DATABASES) через backup API: копия согласована даже '
+        'при одновременной записи. Для проверки реплик локально.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять каждые столько секунд (меньше '
+                 'REPLICA_LAG_SECONDS), 0 - скопировать один раз'
+        )
+
+    def handle(self, *args, **options):
+        if not settings.REPLICA_DATABASES:
+            raise CommandError('Реплики не заданы (DATABASE_REPLICAS)')
+        while True:
+            started = time.perf_counter()
+            self.sync()
+            self.stdout.write(
+                f'Реплики обновлены за {time.perf_counter() - started:.2f} с'
+            )
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def sync(self):
+        source = connections['default']
+        source.ensure_connection()
+        for alias in settings.REPLICA_DATABASES:
+            target = sqlite3.connect(
+                connections[alias].settings_dict['NAME'],
+                timeout=connections[alias].settings_dict['OPTIONS'].get(
+                    'timeout', 5
+                )
+            )
+            try:
+                source.connection.backup(target)
+                apply_pragmas(target, {'journal_mode': 'WAL'})
+            finally:
+                target.close()
@@ -0,0 +1,159 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+
+from core import writer
+from posts.models import Comment, Post, User
+
+# Запись каждого запроса своей транзакцией и через пишущий процесс
+MODES = (('commit', False), ('queue', True))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает запись комментариев из нескольких процессов '
+        '(как воркеры сервера) по нескольку потоков: каждый комментарий '
+        'своей транзакцией (atomic_retry) и через один пишущий процесс '
+        'с фиксацией пачками (WRITE_QUEUE). Замеры идут на временных '
+        'базе и очереди.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=4,
+            help='Сколько процессов пишут одновременно (как воркеры '
+                 'сервера)'
+        )
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='Сколько потоков пишут в каждом процессе (как потоки '
+                 'обработки запросов)'
+        )
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument(
+            '--posts', type=int, default=100,
+            help='Между сколькими записями распределять комментарии'
+        )
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        name = connection.settings_dict['NAME']
+        try:
+            connection.close()
+            connection.settings_dict['NAME'] = os.path.join(
+                directory, 'db.sqlite3'
+            )
+            call_command('migrate', verbosity=0)
+            author = User.objects.create_user(username='benchmark')
+            Post.objects.bulk_create(
+                Post(author=author, text=f'Запись {number}')
+                for number in range(options['posts'])
+            )
+            posts = list(Post.objects.all())
+            self.stdout.write(
+                f'{"режим":<8} {"записей/с":>10} {"ошибок":>7} '
+                f'{"p50, мс":>9} {"p99, мс":>9}'
+            )
+            for mode, queue in MODES:
+                with override_settings(
+                    WRITE_QUEUE=queue,
+                    WRITE_QUEUE_LOCATION=os.path.join(
+                        directory, 'writes.sqlite3'
+                    )
+                ):
+                    self.compare(mode, author, posts, options)
+        finally:
+            connection.close()
+            connection.settings_dict['NAME'] = name
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def worker(self, author, posts, number, deadline, results):
+        done = failed = 0
+        latencies = []
+        while time.time() < deadline:
+            comment = Comment(
+                post=posts[number % len(posts)],
+                author=author,
+                text='x' * 200
+            )
+            number += 1
+            started = time.perf_counter()
+            try:
+                writer.write(comment.save)
+                done += 1
+            except Exception:
+                failed += 1
+            latencies.append(time.perf_counter() - started)
+        connection.close()
+        results.append((done, failed, latencies))
+
+    def run_threads(self, author, posts, offset, deadline, options):
+        results = []
+        threads = [
+            threading.Thread(
+                target=self.worker,
+                args=(author, posts, offset + number, deadline, results)
+            )
+            for number in range(options['threads'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def run_process(self, author, posts, offset, deadline, options,
+                    output):
+        output.put(self.run_threads(author, posts, offset, deadline, options))
+
+    def compare(self, mode, author, posts, options):
+        # Соединение родителя не должно достаться процессам после fork()
+        connection.close()
+        context = multiprocessing.get_context('fork')
+        output = context.Queue()
+        stop = context.Event()
+        if mode == 'queue':
+            serving = context.Process(target=writer.serve, args=(stop,))
+            serving.start()
+        deadline = time.time() + options['seconds']
+        processes = [
+            context.Process(
+                target=self.run_process,
+                args=(
+                    author, posts, number * options['threads'], deadline,
+                    options, output
+                )
+            )
+            for number in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        # Результаты забираются до join(): иначе процесс ждет, пока
+        # очередь не освободится
+        results = [
+            result for _ in processes for result in output.get()
+        ]
+        for process in processes:
+            process.join()
+        stop.set()
+        if mode == 'queue':
+            serving.join()
+        done = sum(result[0] for result in results)
+        failed = sum(result[1] for result in results)
+        latencies = sorted(
+            latency for result in results for latency in result[2]
+        )
+        p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+        p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0
+        self.stdout.write(
+            f'{mode:<8} {done / options["seconds"]:>10.0f} {failed:>7} '
+            f'{p50:>9.1f} {p99:>9.1f}'
+        )
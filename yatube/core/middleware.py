@@ -0,0 +1,157 @@
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.functional import SimpleLazyObject
+
+from . import routers, timing
+from .auth import get_user
+
+logger = logging.getLogger('core.timing')
+
+# Замеры в заголовке Server-Timing и их описание (только латиница)
+METRICS = (
+    ('db', '{db} queries'),
+    ('render', 'templates'),
+    ('thumbnails', '{thumbnails} lookups'),
+    ('cache', '{cache_hit} hits, {cache_miss} misses'),
+)
+
+
+class ServerTimingMiddleware:
+    '''
+    Замеры доли запросов (SERVER_TIMING_SAMPLE_RATE): SQL, отрисовка
+    шаблонов, поиск миниатюр и обращения к кэшу. Результат - заголовок
+    Server-Timing и строка JSON в журнале core.timing. Время отрисовки
+    указано без SQL и миниатюр внутри нее. При нулевой доле
+    middleware отключается при запуске и ничего не стоит.
+    '''
+
+    def __init__(self, get_response):
+        self.rate = settings.SERVER_TIMING_SAMPLE_RATE
+        if not self.rate:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= self.rate:
+            return self.get_response(request)
+        record = timing.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(record))
+                response = self.get_response(request)
+        finally:
+            timing.stop()
+        total = time.perf_counter() - record.started
+        self.report(request, response, record, total)
+        return response
+
+    def process_template_response(self, request, response):
+        '''
+        Отрисовка начинается сразу после этого метода (middleware стоит
+        первым, поэтому вызывается последним) и заканчивается вызовом
+        post-render callback.
+        '''
+        record = timing.current()
+        if record is None:
+            return response
+        started = time.perf_counter()
+        nested = self.nested(record)
+
+        def rendered(response):
+            elapsed = time.perf_counter() - started
+            record.add('render', elapsed - (self.nested(record) - nested))
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def nested(self, record):
+        return record.seconds.get('db', 0) + record.seconds.get(
+            'thumbnails', 0
+        )
+
+    def report(self, request, response, record, total):
+        counts = dict.fromkeys(('cache_hit', 'cache_miss'), 0)
+        counts.update(record.counts)
+        metrics = [
+            f'{name};dur={record.seconds[name] * 1000:.1f};'
+            f'desc="{desc.format(**counts)}"'
+            for name, desc in METRICS if name in record.seconds
+        ]
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        response['Server-Timing'] = ', '.join(metrics)
+        match = request.resolver_match
+        logger.info(json.dumps({
+            'view': match.view_name if match else None,
+            'method': request.method,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'db_ms': round(record.seconds.get('db', 0) * 1000, 2),
+            'db_queries': record.counts.get('db', 0),
+            'render_ms': round(record.seconds.get('render', 0) * 1000, 2),
+            'thumbnails_ms': round(
+                record.seconds.get('thumbnails', 0) * 1000, 2
+            ),
+            'thumbnails': record.counts.get('thumbnails', 0),
+            'cache_ms': round(record.seconds.get('cache', 0) * 1000, 2),
+            'cache_hits': counts['cache_hit'],
+            'cache_misses': counts['cache_miss'],
+        }, ensure_ascii=False))
+
+
+class ReplicaMiddleware:
+    '''
+    Чтение с реплик для GET-запросов к представлениям с атрибутом
+    replica_reads. После записи ставится cookie REPLICA_COOKIE
+    на REPLICA_LAG_SECONDS: пока она есть, автор читает с основной
+    базы и видит свои изменения. Без реплик middleware отключается.
+    '''
+
+    def __init__(self, get_response):
+        if not settings.REPLICA_DATABASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routers.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = routers.stop()
+        if wrote:
+            response.set_cookie(
+                settings.REPLICA_COOKIE, '1',
+                max_age=settings.REPLICA_LAG_SECONDS,
+                httponly=True,
+                samesite='Lax'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        if (
+            request.method in ('GET', 'HEAD')
+            and getattr(view_class, 'replica_reads', False)
+            and settings.REPLICA_COOKIE not in request.COOKIES
+        ):
+            routers.use_replica()
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    '''
+    AuthenticationMiddleware с пользователем запроса из кэша
+    (core.auth.get_user): вместе с сессиями cached_db запрос
+    со свежим кэшем не обращается к базе до кода представления.
+    '''
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
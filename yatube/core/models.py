@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class StandartModel(models.Model):
@@ -15,3 +16,51 @@ class StandartModel(models.Model):
 
     def __str__(self):
         return self.text[:15]
+
+
+class Job(models.Model):
+    '''
+    Фоновая задача (core.jobs): путь к функции и ее аргументы в JSON.
+    Выполненные задачи удаляются, неудачные после всех попыток
+    остаются со статусом FAILED и текстом последней ошибки.
+    '''
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'Ожидает'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Ошибка'),
+    )
+    queue = models.CharField(max_length=50)
+    name = models.CharField(max_length=200)
+    payload = models.TextField()
+    # Ожидающая задача с таким ключом в очереди одна
+    key = models.CharField(max_length=255, null=True, blank=True)
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField()
+    # Для ожидающей - когда запускать, для выполняемой - когда считать
+    # обработчик пропавшим и запускать заново
+    run_at = models.DateTimeField(default=timezone.now)
+    created = models.DateTimeField(auto_now_add=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['key'],
+                condition=models.Q(status='pending'),
+                name='core_job_pending_key'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.queue}, {self.status})'
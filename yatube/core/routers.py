@@ -0,0 +1,58 @@
+import random
+import threading
+
+from django.conf import settings
+
+_local = threading.local()
+
+
+def start():
+    '''Начало запроса: чтение с основной базы, записей еще не было.'''
+    _local.replica = False
+    _local.wrote = False
+
+
+def stop():
+    '''Конец запроса. Возвращает True, если в запросе была запись.'''
+    wrote = getattr(_local, 'wrote', False)
+    start()
+    return wrote
+
+
+def use_replica():
+    _local.replica = True
+
+
+def use_primary():
+    '''Чтение с основной базы до конца запроса.'''
+    _local.replica = False
+
+
+def wrote():
+    '''Отметка записи, которую за запрос выполнил другой поток.'''
+    _local.wrote = True
+
+
+class ReplicaRouter:
+    '''
+    Чтение с реплик (REPLICA_DATABASES) только в запросах, которые
+    разрешил ReplicaMiddleware, остальное - с основной базы. Запись
+    всегда в основную базу и отмечается, чтобы после нее автор
+    какое-то время читал с основной базы.
+    '''
+
+    def db_for_read(self, model, **hints):
+        if getattr(_local, 'replica', False) and settings.REPLICA_DATABASES:
+            return random.choice(settings.REPLICA_DATABASES)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        _local.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии основной базы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.REPLICA_DATABASES
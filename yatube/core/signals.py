@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_out
+from django.core.cache import cache
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .auth import user_cache_key
+from .db import apply_pragmas
+
+User = get_user_model()
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    '''
+    Настройка каждого нового соединения с SQLite (SQLITE_PRAGMAS).
+    При постоянных соединениях (CONN_MAX_AGE) выполняется один раз
+    на соединение.
+    '''
+    if connection.vendor == 'sqlite':
+        apply_pragmas(connection.connection, settings.SQLITE_PRAGMAS)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user(sender, instance, **kwargs):
+    '''
+    Сброс пользователя в кэше запросов при любом сохранении: смена
+    пароля (в том числе в users), правка профиля или в админке,
+    отметка о входе.
+    '''
+    cache.delete(user_cache_key(instance.pk))
+
+
+@receiver(user_logged_out)
+def forget_logged_out_user(sender, request, user, **kwargs):
+    if user is not None:
+        cache.delete(user_cache_key(user.pk))
@@ -0,0 +1,315 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import timing
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires);
+CREATE TABLE IF NOT EXISTS cache_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    entries INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_stats (id, entries, size) VALUES (1, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN
+    UPDATE cache_stats SET entries = entries + 1, size = size + new.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN
+    UPDATE cache_stats SET entries = entries - 1, size = size - old.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache BEGIN
+    UPDATE cache_stats SET size = size - old.size + new.size;
+END;
+'''
+
+# Ключей в одном запросе get_many: число параметров запроса SQLite
+# ограничено (SQLITE_MAX_VARIABLE_NUMBER, в старых версиях - 999)
+GET_MANY_CHUNK = 500
+
+
+class SQLiteCache(BaseCache):
+    '''
+    Кэш в файле SQLite (режим WAL), общий для всех процессов хоста.
+    Поддерживает срок жизни записей, вытеснение давно не читанных
+    записей (LRU) по MAX_ENTRIES и MAX_SIZE и атомарный incr.
+
+    OPTIONS:
+        MAX_ENTRIES - наибольшее количество записей (как у Django);
+        MAX_SIZE - наибольший суммарный размер значений в байтах;
+        CULL_FREQUENCY - при переполнении удаляется 1/CULL_FREQUENCY
+            записей (как у Django);
+        LRU_RESOLUTION - не чаще чем раз в столько секунд чтение
+            записи обновляет время обращения к ней;
+        BUSY_TIMEOUT - сколько секунд ждать блокировку записи.
+    '''
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = int(options.get('MAX_SIZE', 0))
+        self._lru_resolution = float(options.get('LRU_RESOLUTION', 1))
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+
+    @property
+    def _connection(self):
+        # Соединение на поток и процесс: после fork() сокет
+        # родителя использовать нельзя
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path,
+                timeout=self._busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            if connection.execute('PRAGMA user_version').fetchone()[0] < 1:
+                # Файлы, где INSERT OR REPLACE раздул cache_stats,
+                # пересчитываются один раз
+                with _ImmediateTransaction(connection):
+                    connection.execute(
+                        'UPDATE cache_stats SET '
+                        'entries = (SELECT COUNT(*) FROM cache), '
+                        'size = (SELECT COALESCE(SUM(size), 0) FROM cache)'
+                    )
+                    connection.execute('PRAGMA user_version = 1')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _write(self):
+        '''Транзакция записи, сразу берущая блокировку.'''
+        return _ImmediateTransaction(self._connection)
+
+    def _load(self, rows, now):
+        '''Разбор строк: живые значения и ключи, которые пора освежить.'''
+        values, stale = {}, []
+        for key, value, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                continue
+            values[key] = pickle.loads(value)
+            if accessed < now - self._lru_resolution:
+                stale.append(key)
+        return values, stale
+
+    def _touch_accessed(self, keys, now):
+        if keys:
+            self._connection.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?',
+                [(now, key) for key in keys]
+            )
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_key(key, version=version): key for key in keys}
+        for key in keys:
+            self.validate_key(key)
+        if not keys:
+            return {}
+        now = time.time()
+        names = list(keys)
+        rows = []
+        with timing.span('cache'):
+            for start in range(0, len(names), GET_MANY_CHUNK):
+                chunk = names[start:start + GET_MANY_CHUNK]
+                rows.extend(self._connection.execute(
+                    'SELECT key, value, expires, accessed FROM cache '
+                    f'WHERE key IN ({", ".join("?" * len(chunk))})',
+                    chunk
+                ).fetchall())
+            values, stale = self._load(rows, now)
+            self._touch_accessed(stale, now)
+        timing.count('cache_hit', len(values))
+        timing.count('cache_miss', len(keys) - len(values))
+        return {keys[key]: value for key, value in values.items()}
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def _set_many(self, data, timeout):
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        rows = []
+        for key, value in data.items():
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            rows.append((key, blob, expires, now, len(blob)))
+        with self._write() as connection:
+            # Не INSERT OR REPLACE: удаление заменяемой строки не вызывает
+            # триггер cache_delete, и cache_stats росла бы с каждой
+            # перезаписью. UPDATE размера учитывает триггер cache_update
+            connection.executemany(
+                'INSERT INTO cache '
+                '(key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+                'expires = excluded.expires, accessed = excluded.accessed, '
+                'size = excluded.size',
+                rows
+            )
+            self._cull(connection, now)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._set_many({key: value}, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        prepared = {}
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            prepared[key] = value
+        if prepared:
+            self._set_many(prepared, timeout)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._write() as connection:
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?', (key, now)
+            )
+            cursor = connection.execute(
+                'INSERT OR IGNORE INTO cache '
+                '(key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?)',
+                (key, blob, self.get_backend_timeout(timeout), now, len(blob))
+            )
+            added = cursor.rowcount == 1
+            if added:
+                self._cull(connection, now)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        with self._write() as connection:
+            row = connection.execute(
+                'SELECT value FROM cache '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (key, now)
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            connection.execute(
+                'UPDATE cache SET value = ?, accessed = ?, size = ? '
+                'WHERE key = ?',
+                (blob, now, len(blob), key)
+            )
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        with self._write() as connection:
+            cursor = connection.execute(
+                'UPDATE cache SET expires = ?, accessed = ? '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), now, key, now)
+            )
+        return cursor.rowcount == 1
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._connection.execute(
+            'SELECT 1 FROM cache '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time())
+        ).fetchone() is not None
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        for key in keys:
+            self.validate_key(key)
+        if keys:
+            with self._write() as connection:
+                connection.executemany(
+                    'DELETE FROM cache WHERE key = ?',
+                    [(key,) for key in keys]
+                )
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def clear(self):
+        with self._write() as connection:
+            connection.execute('DELETE FROM cache')
+
+    def _cull(self, connection, now):
+        '''Удаление просроченных и давно не читанных записей.'''
+        entries, size = connection.execute(
+            'SELECT entries, size FROM cache_stats'
+        ).fetchone()
+        over_size = self._max_size and size > self._max_size
+        if entries <= self._max_entries and not over_size:
+            return
+        connection.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        entries, size = connection.execute(
+            'SELECT entries, size FROM cache_stats'
+        ).fetchone()
+        over_size = self._max_size and size > self._max_size
+        if entries <= self._max_entries and not over_size:
+            return
+        if self._cull_frequency == 0:
+            connection.execute('DELETE FROM cache')
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE key IN '
+            '(SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+            (max(1, entries // self._cull_frequency),)
+        )
+        if self._max_size:
+            # Удаляем старые записи, пока не уложимся в MAX_SIZE
+            connection.execute(
+                'DELETE FROM cache WHERE key IN ('
+                ' SELECT key FROM ('
+                '  SELECT key, SUM(size) OVER (ORDER BY accessed DESC)'
+                '   AS total FROM cache'
+                ' ) WHERE total > ?'
+                ')',
+                (self._max_size,)
+            )
+
+    def close(self, **kwargs):
+        # Соединение переиспользуется между запросами
+        pass
+
+
+class _ImmediateTransaction:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.connection.execute('COMMIT')
+        else:
+            self.connection.execute('ROLLBACK')
@@ -1,4 +1,53 @@
-from django.test import TestCase, Client
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.http import HttpResponse
+from django.test import (
+    Client,
+    SimpleTestCase,
+    TestCase,
+    RequestFactory,
+    TransactionTestCase,
+    override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core import jobs, writer
+from core.auth import user_cache_key
+from core.db import atomic_retry
+from core.middleware import ReplicaMiddleware
+from core.models import Job
+from core.routers import ReplicaRouter
+from core.sqlite_cache import SQLiteCache
+from posts.models import Comment, FeedItem, Follow, Post
+from posts.utils import cached_count
+from posts.views import AddCommentView, IndexView
+
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
 
 
 class CoreTests(TestCase):
@@ -11,3 +60,499 @@ class CoreTests(TestCase):
     def test_posts_correct_templates(self):
         '''Тест на использование верных шаблонов.'''
         self.assertTemplateUsed(self.guest.get('/random_URL'), 'core/404.html')
+
+
+class ServerTimingTests(TestCase):
+    '''Тестирование замеров запросов ServerTimingMiddleware.'''
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.post = Post.objects.create(
+            author=User.objects.create_user(username='author'),
+            text='Тестовая запись',
+        )
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+    def test_server_timing(self):
+        '''Заголовок Server-Timing и строка журнала по имени страницы.'''
+        url = reverse('posts:post_detail', args=[ServerTimingTests.post.id])
+        with self.assertLogs('core.timing', 'INFO') as logs:
+            response = Client().get(url)
+        header = response['Server-Timing']
+        for metric in ('db;dur=', 'render;dur=', 'cache;dur=', 'total;dur='):
+            self.assertIn(metric, header)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:post_detail')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['db_queries'], 0)
+        self.assertGreater(record['render_ms'], 0)
+        self.assertIn(f'desc="{record["db_queries"]} queries"', header)
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_server_timing_disabled(self):
+        '''При нулевой доле запросов замеров нет.'''
+        response = Client().get(
+            reverse('posts:post_detail', args=[ServerTimingTests.post.id])
+        )
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+@override_settings(SQLITE_RETRY_BACKOFF=0, SQLITE_WRITE_RETRIES=2)
+class SQLiteTuningTests(TransactionTestCase):
+    '''Тестирование настройки соединений и повтора записи.'''
+
+    def test_connection_pragmas(self):
+        '''PRAGMA из SQLITE_PRAGMAS применены к соединению.'''
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+    def test_atomic_retry(self):
+        '''Транзакция повторяется, пока база занята.'''
+        calls = []
+
+        def write():
+            calls.append(connection.in_atomic_block)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'done'
+
+        self.assertEqual(atomic_retry(write), 'done')
+        self.assertEqual(calls, [True, True, True])
+
+    def test_atomic_retry_gives_up(self):
+        '''Другие ошибки и исчерпанные повторы передаются наружу.'''
+        calls = []
+
+        def write(message):
+            calls.append(message)
+            raise OperationalError(message)
+
+        with self.assertRaises(OperationalError):
+            atomic_retry(write, 'database is locked')
+        self.assertEqual(len(calls), 3)
+        with self.assertRaises(OperationalError):
+            atomic_retry(write, 'no such table')
+        self.assertEqual(len(calls), 4)
+
+
+WRITE_SAVEPOINTS = []
+
+
+def add_comment(post_id, author_id, number):
+    '''Запись для тестов очереди: третья завершается ошибкой.'''
+    WRITE_SAVEPOINTS.append(connection.savepoint_state)
+    if number == 2:
+        raise ValueError('ошибка записи')
+    return Comment.objects.create(
+        post_id=post_id,
+        author_id=author_id,
+        text=f'Комментарий {number}'
+    )
+
+
+@override_settings(WRITE_QUEUE=True)
+class WriteQueueTests(TransactionTestCase):
+    '''Тестирование записи через пишущий процесс (group commit).'''
+
+    def setUp(self):
+        WRITE_SAVEPOINTS.clear()
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(author=self.author, text='Запись')
+        self.client.force_login(self.author)
+
+    def start_writer(self):
+        '''Цикл run_writer в потоке: у потока свое соединение с базой.'''
+        stop = threading.Event()
+        thread = threading.Thread(target=writer.serve, args=(stop,))
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(stop.set)
+
+    def test_batch_in_one_transaction(self):
+        '''
+        Записи пачки выполняются в одной транзакции, каждая в своей
+        точке сохранения; ошибка одной не отменяет остальные.
+        '''
+        futures = [
+            writer.submit(add_comment, self.post.id, self.author.id, number)
+            for number in range(4)
+        ]
+        self.start_writer()
+        with self.assertRaises(ValueError):
+            futures[2].result(5)
+        comment, _ = futures[3].result(5)
+        self.assertEqual(comment.text, 'Комментарий 3')
+        self.assertEqual(WRITE_SAVEPOINTS, [1, 2, 3, 4])
+        self.assertEqual(Comment.objects.count(), 3)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 3)
+
+    def test_write_from_view(self):
+        '''Комментарий из формы записан пишущим процессом до ответа.'''
+        self.start_writer()
+        with mock.patch(
+            'core.writer.submit', wraps=writer.submit
+        ) as submit:
+            response = self.client.post(
+                reverse('posts:add_comment', args=[self.post.id]),
+                {'text': 'Комментарий'}
+            )
+        submit.assert_called_once()
+        self.assertRedirects(
+            response, reverse('posts:post_detail', args=[self.post.id])
+        )
+        self.assertTrue(Comment.objects.filter(text='Комментарий').exists())
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_write_model_state(self):
+        '''Модель получает pk, файл картинки сохраняется до передачи.'''
+        self.start_writer()
+        comment = Comment(post=self.post, author=self.author, text='Текст')
+        writer.write(comment.save)
+        self.assertEqual(Comment.objects.get().pk, comment.pk)
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, True)
+        with self.settings(MEDIA_ROOT=media):
+            self.post.image = SimpleUploadedFile(
+                'writer.gif', SMALL_GIF, content_type='image/gif'
+            )
+            writer.write(self.post.save)
+            self.assertTrue(os.path.exists(self.post.image.path))
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).image.name, self.post.image.name
+        )
+
+    @override_settings(WRITE_QUEUE_TIMEOUT=0.1)
+    def test_write_timeout(self):
+        '''Запись, которую никто не взял, снимается с очереди.'''
+        with self.assertRaises(TimeoutError):
+            writer.write(add_comment, self.post.id, self.author.id, 0)
+        self.start_writer()
+        writer.write(add_comment, self.post.id, self.author.id, 1)
+        self.assertEqual(
+            list(Comment.objects.values_list('text', flat=True)),
+            ['Комментарий 1']
+        )
+
+    def test_write_in_transaction(self):
+        '''Внутри открытой транзакции запись выполняется сразу.'''
+        with transaction.atomic():
+            thread = writer.write(threading.current_thread)
+        self.assertIs(thread, threading.current_thread())
+
+
+@override_settings(REPLICA_DATABASES=['replica'])
+class ReplicaRouterTests(TestCase):
+    '''Тестирование чтения с реплик и чтения своих изменений.'''
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Запись')
+
+    def read_database(self, request, view):
+        '''База, с которой представление view читало бы записи.'''
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return HttpResponse(ReplicaRouter().db_for_read(Post))
+
+        middleware = ReplicaMiddleware(get_response)
+        return middleware(request).content.decode()
+
+    def test_replica_reads(self):
+        '''Списки читаются с реплики, остальное - с основной базы.'''
+        factory = RequestFactory()
+        index = IndexView.as_view()
+        self.assertEqual(self.read_database(factory.get('/'), index),
+                         'replica')
+        self.assertEqual(self.read_database(factory.post('/'), index),
+                         'default')
+        self.assertEqual(
+            self.read_database(factory.get('/'), AddCommentView.as_view()),
+            'default'
+        )
+        sticky = factory.get('/')
+        sticky.COOKIES['read_primary'] = '1'
+        self.assertEqual(self.read_database(sticky, index), 'default')
+        # Вне запроса чтение с основной базы
+        self.assertEqual(ReplicaRouter().db_for_read(Post), 'default')
+
+    def test_replica_cookie_after_write(self):
+        '''После комментария автор читает с основной базы.'''
+        client = Client()
+        client.force_login(ReplicaRouterTests.author)
+        response = client.post(
+            reverse('posts:add_comment', args=[ReplicaRouterTests.post.id]),
+            {'text': 'Комментарий'}
+        )
+        self.assertEqual(response.cookies['read_primary']['max-age'], 10)
+        response = client.get(reverse('posts:post_create'))
+        self.assertNotIn('read_primary', response.cookies)
+
+
+class CachedAuthTests(TestCase):
+    '''Тестирование сессий и пользователя запроса из кэша.'''
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='reader', password='old-password-1'
+        )
+        self.client.login(username='reader', password='old-password-1')
+
+    def test_cached_request_without_auth_queries(self):
+        '''Со свежим кэшем сессия и пользователь не читаются из базы.'''
+        url = reverse('posts:follow_index')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.context['user'], self.user)
+        for query in queries:
+            self.assertNotIn('django_session', query['sql'])
+            self.assertNotIn('FROM "auth_user"', query['sql'])
+
+    def test_password_change_ends_other_sessions(self):
+        '''После смены пароля другие сессии завершаются.'''
+        other = Client()
+        other.login(username='reader', password='old-password-1')
+        other.get(reverse('posts:follow_index'))
+        response = self.client.post(reverse('users:password_change'), {
+            'old_password': 'old-password-1',
+            'new_password1': 'new-password-2',
+            'new_password2': 'new-password-2',
+        })
+        self.assertRedirects(response, reverse('users:password_change_done'))
+        self.assertEqual(
+            self.client.get(reverse('posts:follow_index')).status_code, 200
+        )
+        self.assertEqual(
+            other.get(reverse('posts:follow_index')).status_code, 302
+        )
+
+    def test_logout(self):
+        '''После выхода пользователя нет ни в сессии, ни в кэше.'''
+        self.client.get(reverse('posts:follow_index'))
+        self.assertIsNotNone(cache.get(user_cache_key(self.user.pk)))
+        self.client.get(reverse('users:logout'))
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        self.assertEqual(
+            self.client.get(reverse('posts:follow_index')).status_code, 302
+        )
+
+
+JOB_CALLS = []
+
+
+def record_job(value, failures=0):
+    '''Задача для тестов: первые failures вызовов завершаются ошибкой.'''
+    JOB_CALLS.append(value)
+    if JOB_CALLS.count(value) <= failures:
+        raise ValueError('ошибка задачи')
+
+
+@override_settings(JOB_QUEUE=True, JOB_RETRY_DELAY=0)
+class JobTests(TransactionTestCase):
+    '''Тестирование фоновых задач и обработчика run_jobs.'''
+
+    def setUp(self):
+        JOB_CALLS.clear()
+
+    def run_jobs(self):
+        stdout = io.StringIO()
+        call_command('run_jobs', '--once', '--workers', '1', stdout=stdout)
+        return stdout.getvalue()
+
+    def test_enqueue_on_commit(self):
+        '''Задача появляется после фиксации, повтор по ключу отброшен.'''
+        with transaction.atomic():
+            jobs.enqueue(record_job, 'first', key='record')
+            jobs.enqueue(record_job, 'second', key='record')
+            self.assertFalse(Job.objects.exists())
+        self.assertEqual(Job.objects.count(), 1)
+        self.assertIn('Выполнено задач: 1', self.run_jobs())
+        self.assertEqual(JOB_CALLS, ['first'])
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(JOB_QUEUE=False)
+    def test_enqueue_without_queue_on_commit(self):
+        '''Без очереди задача выполняется сразу после фиксации.'''
+        with transaction.atomic():
+            jobs.enqueue(record_job, 'inline')
+            self.assertEqual(JOB_CALLS, [])
+        self.assertEqual(JOB_CALLS, ['inline'])
+        self.assertFalse(Job.objects.exists())
+
+    def test_retries(self):
+        '''Задача повторяется до max_attempts, затем отмечается FAILED.'''
+        jobs.enqueue(record_job, 'retry', failures=1)
+        jobs.enqueue(record_job, 'failed', failures=10, max_attempts=2)
+        self.run_jobs()
+        self.assertEqual(
+            sorted(JOB_CALLS), ['failed', 'failed', 'retry', 'retry']
+        )
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertIn('ошибка задачи', job.last_error)
+
+    def test_queue_limit(self):
+        '''Очередь с выполняемыми задачами по лимиту пропускается.'''
+        with override_settings(JOB_QUEUES={'default': 1, 'mail': 1}):
+            Job.objects.create(
+                queue='mail',
+                name='core.tests.record_job',
+                payload='[[], {}]',
+                status=Job.RUNNING,
+                max_attempts=1,
+                run_at=timezone.now() + timedelta(minutes=1)
+            )
+            jobs.enqueue(record_job, 'mail', queue='mail')
+            jobs.enqueue(record_job, 'default')
+            self.assertIsNone(jobs.claim(['mail']))
+            self.assertEqual(jobs.claim().queue, 'default')
+
+    def test_claim_skips_expired(self):
+        '''Задача пропавшего обработчика - FAILED, берется следующая.'''
+        expired = Job.objects.create(
+            queue='default',
+            name='core.tests.record_job',
+            payload='[[], {}]',
+            status=Job.RUNNING,
+            attempts=1,
+            max_attempts=1,
+            run_at=timezone.now() - timedelta(minutes=1)
+        )
+        jobs.enqueue(record_job, 'next')
+        job = jobs.claim()
+        self.assertIsNotNone(job)
+        self.assertNotEqual(job.id, expired.id)
+        expired.refresh_from_db()
+        self.assertEqual(expired.status, Job.FAILED)
+
+    @override_settings(
+        EMAIL_BACKEND='core.mail.QueuedEmailBackend',
+        JOB_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'
+    )
+    def test_side_effects(self):
+        '''Лента подписчика и письмо появляются после run_jobs.'''
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(
+            username='reader',
+            email='reader@example.com',
+            password='password-1'
+        )
+        Follow.objects.create(user=reader, author=author)
+        post = Post.objects.create(author=author, text='Запись')
+        Client().post(
+            reverse('users:password_reset'), {'email': reader.email}
+        )
+        self.assertFalse(FeedItem.objects.exists())
+        feed = Post.objects.filter(feed_items__user=reader)
+        self.assertEqual(cached_count(feed), 0)
+        self.assertEqual(len(mail.outbox), 0)
+        self.run_jobs()
+        self.assertTrue(
+            FeedItem.objects.filter(user=reader, post=post).exists()
+        )
+        self.assertEqual(cached_count(feed), 1)
+        self.assertEqual(mail.outbox[0].to, [reader.email])
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    '''Тестирование общего кэша в файле SQLite.'''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def test_cache_shared_between_instances(self):
+        '''Значения видны другому экземпляру с тем же файлом.'''
+        self.make_cache().set('key', {'value': 1})
+        self.assertEqual(self.make_cache().get('key'), {'value': 1})
+
+    def test_cache_timeout(self):
+        '''Просроченные значения не возвращаются.'''
+        cache = self.make_cache()
+        cache.set('key', 'value', timeout=-1)
+        self.assertIsNone(cache.get('key'))
+        self.assertTrue(cache.add('key', 'new'))
+        self.assertFalse(cache.add('key', 'other'))
+        self.assertEqual(cache.get('key'), 'new')
+
+    def test_cache_incr(self):
+        '''incr атомарен между потоками и падает на пустом ключе.'''
+        cache = self.make_cache()
+        with self.assertRaises(ValueError):
+            cache.incr('counter')
+        cache.set('counter', 0)
+        threads = [
+            threading.Thread(
+                target=lambda: [cache.incr('counter') for _ in range(50)]
+            )
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(cache.get('counter'), 200)
+
+    def test_cache_get_many_chunks(self):
+        '''get_many читает больше ключей, чем помещается в один запрос.'''
+        cache = self.make_cache(MAX_ENTRIES=2000)
+        data = {f'key_{number}': number for number in range(1200)}
+        cache.set_many(data)
+        self.assertEqual(cache.get_many([*data, 'missing']), data)
+
+    def test_cache_stats_on_overwrite(self):
+        '''Перезапись ключа не меняет количество записей в cache_stats.'''
+        cache = self.make_cache(MAX_ENTRIES=10)
+        for number in range(50):
+            cache.set('key', 'x' * number)
+        for number in range(5):
+            cache.set(f'key_{number}', number)
+        self.assertEqual(cache.get('key'), 'x' * 49)
+        self.assertEqual(
+            cache._connection.execute(
+                'SELECT entries, size FROM cache_stats'
+            ).fetchone(),
+            cache._connection.execute(
+                'SELECT COUNT(*), SUM(size) FROM cache'
+            ).fetchone()
+        )
+
+    def test_cache_lru_eviction(self):
+        '''При переполнении удаляются давно не читанные записи.'''
+        cache = self.make_cache(
+            MAX_ENTRIES=4,
+            CULL_FREQUENCY=2,
+            LRU_RESOLUTION=0
+        )
+        for number in range(4):
+            cache.set(f'key_{number}', number)
+            time.sleep(0.01)
+        cache.get('key_0')
+        cache.set('key_4', 4)
+        self.assertEqual(cache.get('key_0'), 0)
+        self.assertIsNone(cache.get('key_1'))
+        self.assertIsNone(cache.get('key_2'))
+        self.assertEqual(cache.get('key_4'), 4)
+
+    def test_cache_max_size(self):
+        '''Суммарный размер значений не превышает MAX_SIZE.'''
+        cache = self.make_cache(MAX_SIZE=10000)
+        for number in range(10):
+            cache.set(f'key_{number}', 'x' * 2000)
+        self.assertIsNotNone(cache.get('key_9'))
+        self.assertIsNone(cache.get('key_0'))
@@ -0,0 +1,65 @@
+import threading
+import time
+from contextlib import contextmanager
+
+_local = threading.local()
+
+
+class Timing:
+    '''
+    Замеры одного запроса: суммарное время и количество по именам
+    ('db', 'render', 'cache', 'thumbnails'...). Экземпляр служит
+    и оберткой выполнения SQL (connection.execute_wrapper).
+    '''
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = {}
+        self.counts = {}
+
+    def add(self, name, seconds=0, count=1):
+        self.seconds[name] = self.seconds.get(name, 0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + count
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add('db', time.perf_counter() - started)
+
+
+def start():
+    '''Начало замеров запроса в текущем потоке.'''
+    _local.timing = Timing()
+    return _local.timing
+
+
+def stop():
+    _local.timing = None
+
+
+def current():
+    '''Замеры текущего запроса или None, если запрос не замеряется.'''
+    return getattr(_local, 'timing', None)
+
+
+@contextmanager
+def span(name):
+    '''Замер участка кода; вне замеряемого запроса ничего не делает.'''
+    timing = current()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - started)
+
+
+def count(name, number=1):
+    '''Счетчик без времени (попадания в кэш и т.п.).'''
+    timing = current()
+    if timing is not None:
+        timing.add(name, count=number)
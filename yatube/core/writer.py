@@ -0,0 +1,273 @@
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import FileField, Model
+
+from . import routers
+from .db import atomic_retry, is_locked
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS writes (
+    id INTEGER PRIMARY KEY,
+    request BLOB NOT NULL,
+    taken REAL,
+    response BLOB,
+    done REAL
+);
+'''
+
+# Сколько секунд хранить ответы, которые запрос так и не забрал
+RESPONSE_TTL = 60
+
+_local = threading.local()
+# Ждущие ответа записи процесса: номер - Future
+_pending = {}
+_pending_lock = threading.Condition()
+_poller = None
+
+
+def _queue():
+    '''
+    Соединение с очередью записей в файле WRITE_QUEUE_LOCATION: свое
+    на поток и процесс, как у core.sqlite_cache.
+    '''
+    key = (os.getpid(), settings.WRITE_QUEUE_LOCATION)
+    if getattr(_local, 'key', None) != key:
+        directory = os.path.dirname(settings.WRITE_QUEUE_LOCATION)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        queue = sqlite3.connect(
+            settings.WRITE_QUEUE_LOCATION, isolation_level=None
+        )
+        queue.execute('PRAGMA journal_mode=WAL')
+        queue.execute('PRAGMA synchronous=NORMAL')
+        queue.executescript(SCHEMA)
+        _local.queue = queue
+        _local.key = key
+    return _local.queue
+
+
+def _save_files(instance):
+    '''
+    Новые файлы модели записываются в хранилище, как при ее
+    сохранении: через pickle передается только имя файла.
+    '''
+    for field in instance._meta.concrete_fields:
+        if isinstance(field, FileField):
+            field.pre_save(instance, instance._state.adding)
+
+
+def _poll():
+    '''
+    Поток процесса, который забирает ответы пишущего процесса для
+    всех ждущих запросов одним SELECT, а не опросом из каждого.
+    '''
+    while True:
+        with _pending_lock:
+            while not _pending:
+                _pending_lock.wait()
+            write_ids = list(_pending)
+        rows = _queue().execute(
+            'SELECT id, response FROM writes WHERE response IS NOT NULL '
+            f'AND id IN ({", ".join("?" * len(write_ids))})',
+            write_ids
+        ).fetchall()
+        for write_id, response in rows:
+            with _pending_lock:
+                future = _pending.pop(write_id, None)
+            # Запрос мог перестать ждать (WRITE_QUEUE_TIMEOUT)
+            if future is None:
+                continue
+            try:
+                done, value, instance = pickle.loads(response)
+            except Exception as error:
+                done, value = False, error
+            if done:
+                future.set_result((value, instance))
+            else:
+                future.set_exception(value)
+        time.sleep(settings.WRITE_QUEUE_DELAY)
+
+
+def _get_poller():
+    global _poller
+    with _pending_lock:
+        if _poller is None or not _poller.is_alive():
+            # После fork() ответы родителя этому процессу не нужны
+            _pending.clear()
+            _poller = threading.Thread(
+                target=_poll, name='write-queue-poller', daemon=True
+            )
+            _poller.start()
+
+
+def submit(func, *args, **kwargs):
+    '''
+    Постановка записи func(*args, **kwargs) в очередь пишущего
+    процесса (run_writer). Возвращает Future с результатом func и
+    моделью, чей метод был записью, после фиксации транзакции.
+    '''
+    instance = getattr(func, '__self__', None)
+    if isinstance(instance, Model):
+        _save_files(instance)
+    request = pickle.dumps((func, args, kwargs))
+    _get_poller()
+    future = Future()
+    future.write_id = _queue().execute(
+        'INSERT INTO writes (request) VALUES (?)', (request,)
+    ).lastrowid
+    with _pending_lock:
+        _pending[future.write_id] = future
+        _pending_lock.notify()
+    return future
+
+
+def write(func, *args, **kwargs):
+    '''
+    Запись из запроса. При WRITE_QUEUE она передается через очередь
+    пишущему процессу (run_writer), который фиксирует записи всех
+    процессов сервера пачками одной транзакцией (group commit), и
+    запрос ждет фиксации; иначе - своя транзакция (atomic_retry).
+    func и аргументы передаются через pickle: связанный метод модели
+    (comment.save) подходит, замыкание - нет; модель после записи
+    получает сохраненное состояние (pk). Возвращает результат func
+    или передает ее ошибку. Внутри открытой транзакции запись
+    выполняется сразу: пишущий процесс не увидит ее незафиксированных
+    данных.
+    '''
+    if not settings.WRITE_QUEUE or connection.in_atomic_block:
+        return atomic_retry(func, *args, **kwargs)
+    # Запись идет в другом процессе, ReplicaRouter ее не заметит
+    routers.wrote()
+    future = submit(func, *args, **kwargs)
+    try:
+        value, instance = future.result(settings.WRITE_QUEUE_TIMEOUT)
+    except TimeoutError:
+        # Запись, которую пишущий процесс еще не взял, снимается
+        # с очереди: иначе она выполнится после ответа об ошибке
+        _queue().execute(
+            'DELETE FROM writes WHERE id = ? AND taken IS NULL',
+            (future.write_id,)
+        )
+        with _pending_lock:
+            _pending.pop(future.write_id, None)
+        raise
+    if instance is not None:
+        func.__self__.__dict__.update(instance.__dict__)
+    return value
+
+
+def _take():
+    '''Следующая пачка из очереди с отметкой, что она взята.'''
+    return sorted(_queue().execute(
+        'UPDATE writes SET taken = ? WHERE id IN ('
+        'SELECT id FROM writes WHERE taken IS NULL ORDER BY id LIMIT ?'
+        ') RETURNING id, request',
+        (time.time(), settings.WRITE_QUEUE_BATCH_SIZE)
+    ).fetchall())
+
+
+def _apply(batch):
+    '''
+    Записи пачки в одной транзакции, каждая - в своей точке сохранения:
+    ошибка одной записи не отменяет остальные. Занятость базы
+    передается наружу, и atomic_retry повторяет всю пачку.
+    '''
+    results = []
+    for _, func, args, kwargs in batch:
+        try:
+            with transaction.atomic():
+                results.append((True, func(*args, **kwargs)))
+        except Exception as error:
+            if is_locked(error):
+                raise
+            results.append((False, error))
+    return results
+
+
+def _response(done, value, func=None):
+    instance = getattr(func, '__self__', None)
+    if not isinstance(instance, Model):
+        instance = None
+    try:
+        return pickle.dumps((done, value, instance))
+    except Exception as error:
+        return pickle.dumps((False, RuntimeError(repr(error)), None))
+
+
+def _finish(responses):
+    '''Ответы пачки и удаление давно не забранных - одна транзакция.'''
+    now = time.time()
+    queue = _queue()
+    queue.execute('BEGIN IMMEDIATE')
+    try:
+        queue.executemany(
+            'UPDATE writes SET response = ?, done = ? WHERE id = ?',
+            [(response, now, write_id) for write_id, response in responses]
+        )
+        queue.execute(
+            'DELETE FROM writes WHERE done < ?', (now - RESPONSE_TTL,)
+        )
+    except Exception:
+        queue.execute('ROLLBACK')
+        raise
+    queue.execute('COMMIT')
+
+
+def _commit(rows):
+    close_old_connections()
+    batch = []
+    responses = []
+    for write_id, request in rows:
+        try:
+            batch.append((write_id, *pickle.loads(request)))
+        except Exception as error:
+            responses.append((write_id, _response(False, error)))
+    try:
+        results = atomic_retry(_apply, batch)
+    except Exception as error:
+        logger.exception('Не удалось записать пачку из %s', len(batch))
+        results = [(False, error)] * len(batch)
+    for (write_id, func, *_), (done, value) in zip(batch, results):
+        responses.append((write_id, _response(done, value, func)))
+    _finish(responses)
+
+
+def serve(stop=None):
+    '''
+    Цикл пишущего процесса (run_writer, запускается один): записи
+    всех процессов сервера забираются из очереди пачками до
+    WRITE_QUEUE_BATCH_SIZE и фиксируются одной транзакцией, поэтому
+    процессы не борются за блокировку записи SQLite. Пока идет
+    транзакция, в очереди копится следующая пачка. stop -
+    threading.Event для остановки цикла.
+    '''
+    # Записи, взятые пишущим процессом, который завершился до ответа:
+    # неизвестно, зафиксированы ли они, поэтому не повторяются
+    _finish([
+        (write_id, _response(False, RuntimeError(
+            'Пишущий процесс остановился, запись могла не сохраниться'
+        )))
+        for write_id, in _queue().execute(
+            'SELECT id FROM writes '
+            'WHERE taken IS NOT NULL AND response IS NULL'
+        ).fetchall()
+    ])
+    try:
+        while stop is None or not stop.is_set():
+            rows = _take()
+            if rows:
+                _commit(rows)
+            else:
+                time.sleep(settings.WRITE_QUEUE_DELAY)
+    finally:
+        connection.close()
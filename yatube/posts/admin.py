@@ -1,5 +1,8 @@
-from django.contrib import admin
-from .models import Post, Group
+from django.contrib import admin, messages
+from django.contrib.auth.admin import UserAdmin
+from .export import export_response
+from .models import Post, Group, User
+from .search import search_posts
 from django.conf import settings
 
 
@@ -18,5 +21,31 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = settings.EMPTY
 
+    def get_search_results(self, request, queryset, search_term):
+        '''Поиск по полнотекстовому индексу вместо LIKE по всей таблице.'''
+        if not search_term:
+            return queryset, False
+        return search_posts(queryset, search_term), False
+
 
 admin.site.register(Group)
+
+
+admin.site.unregister(User)
+
+
+@admin.register(User)
+class ExportUserAdmin(UserAdmin):
+    '''Администратор пользователей с выгрузкой их данных.'''
+    actions = ('export_content',)
+
+    def export_content(self, request, queryset):
+        if queryset.count() != 1:
+            self.message_user(
+                request,
+                'Выберите одного пользователя для выгрузки',
+                messages.WARNING
+            )
+            return None
+        return export_response(queryset.get(), 'zip')
+    export_content.short_description = 'Выгрузить записи и комментарии (ZIP)'
@@ -0,0 +1,220 @@
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from core import routers
+
+from .models import Group, Post
+
+
+def _generation_key(scope):
+    return f'generation:{scope}'
+
+
+def _modified_key(scope):
+    return f'modified:{scope}'
+
+
+def _initial_generation():
+    # Поколение начинается с текущего времени, чтобы после вытеснения
+    # счетчика из кэша не вернуться к уже использованным значениям.
+    return int(time.time() * 1000)
+
+
+def generations(*scopes):
+    '''Текущие поколения областей кэша в порядке перечисления.'''
+    keys = [_generation_key(scope) for scope in scopes]
+    values = cache.get_many(keys)
+    missing = {
+        key: _initial_generation() for key in keys if key not in values
+    }
+    if missing:
+        cache.set_many(missing, None)
+        values.update(missing)
+    return [values[key] for key in keys]
+
+
+def generation(scope):
+    '''Текущее поколение одной области кэша.'''
+    return generations(scope)[0]
+
+
+def modified(*scopes):
+    '''
+    Время последнего сдвига поколения любой из областей.
+    Если время вытеснено из кэша, область считается измененной сейчас.
+    '''
+    keys = [_modified_key(scope) for scope in scopes]
+    values = cache.get_many(keys)
+    now = time.time()
+    missing = {key: now for key in keys if key not in values}
+    if missing:
+        cache.set_many(missing, None)
+        values.update(missing)
+    return max(values.values())
+
+
+def bump(*scopes):
+    '''Сдвиг поколения: все ключи, построенные на старом, устаревают.'''
+    for scope in scopes:
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_generation(), None)
+    now = time.time()
+    cache.set_many({_modified_key(scope): now for scope in scopes}, None)
+
+
+def bump_on_commit(*scopes):
+    '''
+    Сдвиг поколения после записи в базу (сигналы моделей): сразу и
+    еще раз после фиксации транзакции. Запрос, который успел
+    закэшировать страницу по старым данным, пока транзакция не
+    зафиксирована, не оставит ее в кэше под новым поколением.
+    '''
+    bump(*scopes)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: bump(*scopes))
+
+
+def post_scopes(post):
+    '''Области кэша страниц, на которых показывается запись.'''
+    group_ids = {post.group_id, post._loaded_group_id} - {None}
+    slugs = Group.objects.filter(
+        id__in=group_ids
+    ).values_list('slug', flat=True)
+    return [
+        'index',
+        f'author:{post.author.username}',
+        f'post:{post.id}',
+        *(f'group:{slug}' for slug in slugs),
+    ]
+
+
+def _page_cache_key(request, scopes):
+    path = md5(request.get_full_path().encode()).hexdigest()
+    # 'display' - отображаемые имена авторов и названия групп,
+    # которые встречаются на любой странице со списком записей
+    versions = '.'.join(
+        str(value) for value in generations('display', *scopes)
+    )
+    return (
+        f'page:{request.resolver_match.view_name}:{path}:'
+        f'{request.user.pk or 0}:{versions}'
+    )
+
+
+def generation_cache_page(*scopes):
+    '''
+    Кэширование страницы до изменения ее содержимого.
+    Области вида 'group:{slug}' заполняются аргументами URL; ключ
+    страницы включает их поколения, поэтому сдвиг поколения
+    (posts.signals) сразу выводит страницу из кэша.
+    '''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            key = _page_cache_key(
+                request,
+                [scope.format(**kwargs) for scope in scopes]
+            )
+            response = cache.get(key)
+            if response is not None:
+                return response
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200 or response.cookies:
+                return response
+
+            def store(response):
+                cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+
+            if hasattr(response, 'render') and callable(response.render):
+                response.add_post_render_callback(store)
+            else:
+                store(response)
+            return response
+        return wrapper
+    return decorator
+
+
+def post_page_scopes(request, post_id):
+    '''
+    Области страницы записи: сама запись и ее автор,
+    у которого на странице выводится количество записей.
+    '''
+    usernames = Post.objects.filter(id=post_id).values_list(
+        'author__username', flat=True
+    )
+    return [f'post:{post_id}', *(f'author:{name}' for name in usernames)]
+
+
+def _page_state(request, scopes, kwargs):
+    '''
+    ETag и Last-Modified страницы по поколениям ее областей кэша.
+    Считаются один раз на запрос: condition() спрашивает их по отдельности.
+    '''
+    state = getattr(request, '_page_state', None)
+    if state is None:
+        names = ['display']
+        for scope in scopes:
+            if callable(scope):
+                names += scope(request, **kwargs)
+            else:
+                names.append(scope.format(user=request.user.pk, **kwargs))
+        versions = '.'.join(str(value) for value in generations(*names))
+        etag = md5(
+            f'{request.get_full_path()}:{request.user.pk or 0}:{versions}'
+            .encode()
+        ).hexdigest()
+        last_modified = datetime.fromtimestamp(
+            int(modified(*names)), tz=timezone.utc
+        )
+        state = request._page_state = (etag, last_modified)
+    return state
+
+
+def conditional_page(*scopes):
+    '''
+    Условный GET: ETag и Last-Modified страницы строятся по поколениям
+    ее областей кэша и пользователю, поэтому ответ 304 отдается
+    без шаблона и запросов списка записей. Области - строки
+    с подстановкой аргументов URL и {user} либо функции
+    (request, **kwargs), возвращающие список областей.
+    '''
+    def etag(request, *args, **kwargs):
+        return _page_state(request, scopes, kwargs)[0]
+
+    def last_modified(request, *args, **kwargs):
+        return _page_state(request, scopes, kwargs)[1]
+
+    def decorator(view):
+        view = condition(etag_func=etag, last_modified_func=last_modified)(
+            view
+        )
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            last_modified = _page_state(request, scopes, kwargs)[1]
+            # Реплика могла еще не получить недавние изменения страницы:
+            # иначе устаревшая страница попадет в кэш с новым поколением
+            if time.time() - last_modified.timestamp() < (
+                settings.REPLICA_LAG_SECONDS + 1
+            ):
+                routers.use_primary()
+            response = view(request, *args, **kwargs)
+            # Страница зависит от пользователя: только кэш браузера,
+            # который обязан свериться с сервером
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
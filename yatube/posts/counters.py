@@ -0,0 +1,76 @@
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+
+def _add(field, delta):
+    '''
+    Выражение field + delta для UPDATE. Уменьшение не опускает счетчик
+    ниже нуля: поле беззнаковое, а разошедшийся счетчик (например,
+    удаление до пересчета) иначе сломал бы UPDATE.
+    '''
+    if delta >= 0:
+        return F(field) + delta
+    return Greatest(F(field) + delta, 0)
+
+
+def change_user_stats(user_id, **deltas):
+    '''
+    Изменение счетчиков пользователя на deltas одним UPDATE.
+    Строка создается только при увеличении: при каскадном удалении
+    пользователя уменьшать уже нечего.
+    '''
+    UserStats = apps.get_model('posts', 'UserStats')
+    changes = {field: _add(field, delta) for field, delta in deltas.items()}
+    updated = UserStats.objects.filter(user_id=user_id).update(**changes)
+    if not updated and all(delta > 0 for delta in deltas.values()):
+        UserStats.objects.get_or_create(user_id=user_id)
+        UserStats.objects.filter(user_id=user_id).update(**changes)
+
+
+def change_comments_count(post_id, delta):
+    '''Изменение количества комментариев записи.'''
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.filter(id=post_id).update(
+        comments_count=_add('comments_count', delta)
+    )
+
+
+def _count(queryset, field):
+    '''Подзапрос COUNT(*) по внешнему ключу field для UPDATE.'''
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+                field
+            ).annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def recount():
+    '''Пересчет всех счетчиков несколькими массовыми UPDATE.'''
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    UserStats = apps.get_model('posts', 'UserStats')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+
+    missing = list(User.objects.filter(stats__isnull=True).values_list(
+        'pk', flat=True
+    ))
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=pk) for pk in missing),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+    UserStats.objects.update(
+        posts_count=_count(Post.objects.all(), 'author'),
+        followers_count=_count(Follow.objects.all(), 'author'),
+        following_count=_count(Follow.objects.all(), 'user'),
+    )
+    Post.objects.update(
+        comments_count=_count(Comment.objects.all(), 'post')
+    )
@@ -0,0 +1,127 @@
+import json
+import zipfile
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import Comment, Post
+
+
+def records(user):
+    '''
+    Записи и комментарии пользователя в формате import_content.
+    Выборки читаются курсором пачками, а не целиком в память.
+    '''
+    chunk_size = settings.EXPORT_CHUNK_SIZE
+    posts = Post.objects.filter(author=user).select_related(
+        'group'
+    ).order_by('id')
+    for post in posts.iterator(chunk_size=chunk_size):
+        yield {
+            'type': 'post',
+            'id': post.id,
+            'author': user.username,
+            'group': post.group.slug if post.group_id else None,
+            'text': post.text,
+            'pub_date': post.pub_date.isoformat(),
+            'image': post.image.name or None,
+        }
+    comments = Comment.objects.filter(author=user).order_by('id')
+    for comment in comments.iterator(chunk_size=chunk_size):
+        yield {
+            'type': 'comment',
+            'id': comment.id,
+            'post': comment.post_id,
+            'author': user.username,
+            'text': comment.text,
+            'pub_date': comment.pub_date.isoformat(),
+        }
+
+
+def ndjson(user):
+    '''Выгрузка построчно: одна строка JSON на запись.'''
+    for record in records(user):
+        yield (json.dumps(record, ensure_ascii=False) + '\n').encode()
+
+
+class _Stream:
+    '''
+    Файл только для записи, из которого генератор забирает
+    накопленные байты: zipfile пишет в него архив по частям.
+    '''
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        '''Накопленные байты (пустой список, если их нет).'''
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return [data] if data else []
+
+
+def _image_names(user):
+    return Post.objects.filter(author=user).exclude(image='').order_by(
+        'id'
+    ).values_list('image', flat=True).iterator(
+        chunk_size=settings.EXPORT_CHUNK_SIZE
+    )
+
+
+def zip_archive(user):
+    '''
+    ZIP с content.ndjson и картинками записей. Архив собирается
+    на лету: в памяти не больше одной порции файла.
+    '''
+    stream = _Stream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+        info = zipfile.ZipInfo(
+            'content.ndjson', timezone.now().timetuple()[:6]
+        )
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with archive.open(info, 'w', force_zip64=True) as file:
+            for line in ndjson(user):
+                file.write(line)
+                yield from stream.pop()
+        for name in _image_names(user):
+            if not default_storage.exists(name):
+                continue
+            info = zipfile.ZipInfo(
+                name, default_storage.get_modified_time(name).timetuple()[:6]
+            )
+            # Картинки уже сжаты
+            info.compress_type = zipfile.ZIP_STORED
+            with default_storage.open(name) as source:
+                with archive.open(info, 'w', force_zip64=True) as file:
+                    for chunk in source.chunks():
+                        file.write(chunk)
+                        yield from stream.pop()
+    yield from stream.pop()
+
+
+def export_response(user, export_format):
+    '''Потоковый ответ с выгрузкой пользователя (ndjson или zip).'''
+    if export_format == 'zip':
+        content, content_type = zip_archive(user), 'application/zip'
+    else:
+        export_format = 'ndjson'
+        content, content_type = ndjson(user), 'application/x-ndjson'
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = (
+        f'attachment; filename="{user.username}.{export_format}"'
+    )
+    return response
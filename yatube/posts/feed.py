@@ -0,0 +1,132 @@
+from django.conf import settings
+from django.db import connection
+
+from .caching import bump
+from .models import FeedItem, Follow, Post
+
+
+def _batches(queryset, batch_size):
+    '''Обход выборки пачками по возрастанию id без OFFSET.'''
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id).order_by('id')[
+            :batch_size
+        ])
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1].id
+
+
+def fan_out(post):
+    '''Добавление новой записи в ленты всех подписчиков автора.'''
+    batch_size = settings.FEED_BATCH_SIZE
+    follows = Follow.objects.filter(author_id=post.author_id).only('user_id')
+    for batch in _batches(follows, batch_size):
+        FeedItem.objects.bulk_create(
+            (
+                FeedItem(
+                    user_id=follow.user_id,
+                    post_id=post.id,
+                    author_id=post.author_id,
+                    pub_date=post.pub_date,
+                )
+                for follow in batch
+            ),
+            batch_size=batch_size,
+            ignore_conflicts=True
+        )
+
+
+def backfill(user_id, author_id):
+    '''Заполнение ленты подписчика записями автора после подписки.'''
+    batch_size = settings.FEED_BATCH_SIZE
+    posts = Post.objects.filter(author_id=author_id).only('id', 'pub_date')
+    for batch in _batches(posts, batch_size):
+        FeedItem.objects.bulk_create(
+            (
+                FeedItem(
+                    user_id=user_id,
+                    post_id=post.id,
+                    author_id=author_id,
+                    pub_date=post.pub_date,
+                )
+                for post in batch
+            ),
+            batch_size=batch_size,
+            ignore_conflicts=True
+        )
+
+
+def remove(user_id, author_id):
+    '''Удаление записей автора из ленты после отписки.'''
+    batch_size = settings.FEED_BATCH_SIZE
+    items = FeedItem.objects.filter(user_id=user_id, author_id=author_id)
+    while True:
+        ids = list(items.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return
+        FeedItem.objects.filter(id__in=ids).delete()
+
+
+def fan_out_post(post_id):
+    '''
+    Задача: рассылка новой записи по лентам. Страницы лент и количества
+    записей (cached_count) сбрасываются еще раз: при сохранении записи
+    ее в лентах еще не было.
+    '''
+    post = Post.objects.filter(id=post_id).only(
+        'id', 'author_id', 'pub_date'
+    ).first()
+    # Запись удалили, пока задача ждала очереди
+    if post is None:
+        return
+    fan_out(post)
+    bump('index', 'posts')
+
+
+def sync_follow(user_id, author_id):
+    '''
+    Задача: лента подписчика по текущему состоянию подписки -
+    заполнение, если подписка есть, и очистка, если нет. Подписка
+    и отписка подряд дают верный результат в любом порядке задач.
+    '''
+    if Follow.objects.filter(user_id=user_id, author_id=author_id).exists():
+        backfill(user_id, author_id)
+    else:
+        remove(user_id, author_id)
+    bump(f'feed:{user_id}', 'posts')
+
+
+def rebuild():
+    '''Полная пересборка лент из подписок. Возвращает число подписок.'''
+    batch_size = settings.FEED_BATCH_SIZE
+    while True:
+        ids = list(FeedItem.objects.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        FeedItem.objects.filter(id__in=ids).delete()
+    follows_count = 0
+    follows = Follow.objects.only('user_id', 'author_id')
+    for batch in _batches(follows, batch_size):
+        for follow in batch:
+            backfill(follow.user_id, follow.author_id)
+        follows_count += len(batch)
+    return follows_count
+
+
+def fill_missing():
+    '''
+    Добавление в ленты всех недостающих записей одним INSERT ... SELECT
+    (после массовой загрузки, минующей сигналы). Возвращает их число.
+    '''
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR IGNORE INTO {FeedItem._meta.db_table} '
+            '(user_id, post_id, author_id, pub_date) '
+            'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+            f'FROM {Follow._meta.db_table} f '
+            f'INNER JOIN {Post._meta.db_table} p '
+            'ON p.author_id = f.author_id'
+        )
+        return cursor.rowcount
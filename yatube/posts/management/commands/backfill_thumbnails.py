@@ -0,0 +1,170 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from posts import thumbnails
+from posts.models import Post
+
+
+def _refresh(post_id, image_name):
+    '''Задача процесса пула: варианты картинки одной записи.'''
+    try:
+        return thumbnails.refresh(post_id, image_name)
+    finally:
+        close_old_connections()
+
+
+def _images(last_id, batch_size):
+    '''
+    Записи с картинками после last_id пачками по id: курсор
+    не держится открытым, пока идет запись в базу.
+    '''
+    while True:
+        batch = list(
+            Post.objects.exclude(image='').filter(
+                id__gt=last_id
+            ).order_by('id').values_list('id', 'image')[:batch_size]
+        )
+        yield from batch
+        if len(batch) < batch_size:
+            return
+        last_id = batch[-1][0]
+
+
+class _Inline:
+    '''Выполнение задач в текущем процессе (--processes 0).'''
+
+    def submit(self, function, *args):
+        future = Future()
+        try:
+            future.set_result(function(*args))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает недостающие варианты картинок всех записей в пуле '
+        'процессов и заполняет хранилище ключей sorl-thumbnail. '
+        'Продолжает с места остановки по файлу контрольной точки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='Количество процессов, 0 - в текущем процессе'
+        )
+        parser.add_argument(
+            '--rate', type=float, default=0,
+            help='Не больше стольких картинок в секунду, 0 - без ограничения'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(
+                settings.BASE_DIR, 'backfill_thumbnails.txt'
+            ),
+            help='Файл с id последней обработанной записи'
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать с первой записи, не глядя на контрольную точку'
+        )
+        parser.add_argument(
+            '--progress-every', type=int, default=100,
+            help='Как часто (в записях) выводить прогресс'
+        )
+
+    def handle(self, *args, **options):
+        checkpoint = options['checkpoint']
+        last_id = 0 if options['restart'] else self.read_checkpoint(
+            checkpoint
+        )
+        total = Post.objects.exclude(image='').filter(id__gt=last_id).count()
+        self.stdout.write(
+            f'Записей с картинками после id={last_id}: {total}'
+        )
+        if not total:
+            return
+
+        processes = options['processes']
+        if processes:
+            # Процессы пула не должны унаследовать открытые соединения
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=processes)
+        else:
+            executor = _Inline()
+        interval = 1 / options['rate'] if options['rate'] else 0
+        window = max(processes, 1) * 2
+        queue = deque()
+        done = created = 0
+        started = next_submit = time.monotonic()
+        try:
+            for post_id, image_name in _images(
+                last_id, settings.FEED_BATCH_SIZE
+            ):
+                if interval:
+                    delay = next_submit - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_submit = max(
+                        next_submit, time.monotonic()
+                    ) + interval
+                queue.append(
+                    (post_id, executor.submit(_refresh, post_id, image_name))
+                )
+                # Результаты забираем по порядку id: контрольная точка
+                # не обгоняет незавершенные записи
+                while len(queue) >= window:
+                    created += self.collect(queue, checkpoint)
+                    done += 1
+                    self.progress(done, total, created, started, options)
+            while queue:
+                created += self.collect(queue, checkpoint)
+                done += 1
+                self.progress(done, total, created, started, options)
+        finally:
+            executor.shutdown(wait=True)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {done} записей, создано вариантов: {created}'
+        ))
+
+    def collect(self, queue, checkpoint):
+        post_id, future = queue.popleft()
+        try:
+            created = future.result()
+        except Exception as error:
+            # Битая картинка не должна останавливать весь проход
+            self.stderr.write(f'Запись {post_id}: {error!r}')
+            created = 0
+        with open(checkpoint, 'w') as file:
+            file.write(str(post_id))
+        return created
+
+    def progress(self, done, total, created, started, options):
+        if done % options['progress_every'] and done != total:
+            return
+        elapsed = time.monotonic() - started
+        rate = done / elapsed if elapsed else 0
+        left = (total - done) / rate if rate else 0
+        self.stdout.write(
+            f'{done}/{total} ({done / total:.0%}), '
+            f'создано вариантов: {created}, '
+            f'{rate:.1f} записей/с, осталось ~{left:.0f} с'
+        )
+
+    @staticmethod
+    def read_checkpoint(path):
+        try:
+            with open(path) as file:
+                return int(file.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
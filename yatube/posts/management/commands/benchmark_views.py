@@ -0,0 +1,312 @@
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from posts.models import FeedItem, Group, Post, User
+from posts.urls import urlpatterns
+
+# Страницы, которые при GET меняют данные или только перенаправляют
+SKIP = ('add_comment', 'profile_follow', 'profile_unfollow')
+
+
+class QueryCounter:
+    '''Обертка выполнения SQL: количество запросов и их общее время.'''
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+def percentile(timings, number):
+    if len(timings) < 2:
+        return timings[0]
+    return statistics.quantiles(timings, n=100)[number - 1]
+
+
+def regressions(results, baseline, threshold):
+    '''
+    Ухудшения относительно прошлого прогона: время p95 и пиковая память
+    выросли больше чем на threshold, количество запросов - на любое число.
+    '''
+    found = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in ('p95_ms', 'peak_kb'):
+            if current[metric] > previous[metric] * (1 + threshold):
+                found.append(
+                    f'{name}: {metric} {previous[metric]} -> '
+                    f'{current[metric]}'
+                )
+        if current['queries'] > previous['queries']:
+            found.append(
+                f'{name}: queries {previous["queries"]} -> '
+                f'{current["queries"]}'
+            )
+    return found
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет страницы posts.urls через WSGI-обработчик в том же '
+        'процессе на большой сгенерированной базе: время ответа '
+        '(p50/p95/p99), количество и время SQL-запросов, пиковую память. '
+        'Страницы с кэшем замеряются без кэша (cold) и из кэша (warm). '
+        'Результат пишется в JSON и сравнивается с прошлым прогоном.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--db',
+            default=os.path.join(settings.BASE_DIR, 'benchmark.sqlite3'),
+            help='Файл базы для замеров; если его нет, он создается '
+                 'командой generate_dataset. "-" - текущая база как есть'
+        )
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--posts', type=int, default=500_000)
+        parser.add_argument('--comments', type=int, default=500_000)
+        parser.add_argument('--follows', type=int, default=50_000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Сколько замеренных запросов к каждой странице'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=3,
+            help='Сколько запросов сделать до замеров'
+        )
+        parser.add_argument(
+            '--output', help='Куда записать результат (JSON)'
+        )
+        parser.add_argument(
+            '--baseline', help='Прошлый результат (JSON) для сравнения'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимый рост p95 и памяти, доля (0.2 = 20%%)'
+        )
+
+    def handle(self, *args, **options):
+        if options['db'] != '-':
+            self.use_database(options)
+        else:
+            # Текущая база может быть в памяти (тесты): соединение
+            # не закрывается вокруг каждого запроса
+            request_started.disconnect(close_old_connections)
+            request_finished.disconnect(close_old_connections)
+        location = tempfile.mkdtemp()
+        try:
+            # Отдельный кэш, чтобы не сбрасывать рабочий
+            with override_settings(CACHES={'default': {
+                'BACKEND': 'core.sqlite_cache.SQLiteCache',
+                'LOCATION': os.path.join(location, 'cache.sqlite3'),
+            }}):
+                results = self.run(options)
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+            for name in os.listdir(location):
+                os.remove(os.path.join(location, name))
+            os.rmdir(location)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+            found = regressions(
+                results['views'], baseline['views'], options['threshold']
+            )
+            if found:
+                raise CommandError(
+                    'Замедление относительно базового прогона:\n'
+                    + '\n'.join(found)
+                )
+            self.stdout.write(self.style.SUCCESS(
+                'Замедлений относительно базового прогона нет'
+            ))
+
+    def use_database(self, options):
+        '''Переключение на отдельную базу, при первом запуске - с данными.'''
+        path = options['db']
+        created = not os.path.exists(path)
+        connection.close()
+        connection.settings_dict['NAME'] = path
+        if not created:
+            return
+        call_command('migrate', verbosity=0)
+        call_command(
+            'generate_dataset',
+            '--users', str(options['users']),
+            '--posts', str(options['posts']),
+            '--comments', str(options['comments']),
+            '--follows', str(options['follows']),
+            '--seed', str(options['seed']),
+            stdout=self.stdout,
+        )
+
+    def pages(self):
+        '''
+        Адреса страниц posts.urls для замера. Аргументы - самые тяжелые
+        варианты: группа и автор с наибольшим числом записей, запись
+        с наибольшим числом комментариев, лента самого подписанного
+        читателя (он же входит на страницы, требующие входа).
+        '''
+        group = Group.objects.annotate(
+            total=Count('posts')
+        ).order_by('-total').first()
+        author = User.objects.annotate(
+            total=Count('posts')
+        ).order_by('-total').first()
+        post = Post.objects.order_by('-comments_count', 'id').first()
+        if author is None or post is None:
+            raise CommandError('В базе нет записей для замеров')
+        reader = User.objects.filter(id=FeedItem.objects.values(
+            'user'
+        ).annotate(total=Count('id')).order_by('-total').values(
+            'user'
+        )[:1]).first() or author
+        own_post = Post.objects.filter(author=reader).first() or post
+        values = {
+            'slug': group.slug if group else '',
+            'username': author.username,
+            'post_id': post.id,
+        }
+        queries = {
+            'search': urlencode({'q': post.text.split()[0].strip('.,')}),
+            'export': urlencode({'format': 'ndjson'}),
+        }
+        pages = []
+        for pattern in urlpatterns:
+            if pattern.name in SKIP:
+                continue
+            kwargs = {
+                name: values[name] for name in pattern.pattern.converters
+            }
+            if pattern.name == 'post_edit':
+                kwargs['post_id'] = own_post.id
+            pages.append((
+                pattern.name,
+                reverse(f'posts:{pattern.name}', kwargs=kwargs),
+                queries.get(pattern.name, ''),
+            ))
+        return reader, pages
+
+    def run(self, options):
+        reader, pages = self.pages()
+        client = Client()
+        client.force_login(reader)
+        cookie = f'{settings.SESSION_COOKIE_NAME}=' + client.cookies[
+            settings.SESSION_COOKIE_NAME
+        ].value
+        handler = WSGIHandler()
+        results = {}
+        self.stdout.write(
+            f'{"страница":<22} {"код":>4} {"p50, мс":>9} {"p95, мс":>9} '
+            f'{"p99, мс":>9} {"SQL":>5} {"SQL, мс":>8} {"память, КБ":>11}'
+        )
+        for name, path, query in pages:
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': path,
+                'QUERY_STRING': query,
+                'HTTP_COOKIE': cookie,
+            }
+            setup_testing_defaults(environ)
+            for mode in ('cold', 'warm'):
+                result = self.measure(
+                    handler, environ, mode == 'cold', options
+                )
+                results[f'{name} ({mode})'] = result
+                self.stdout.write(
+                    f'{name + " (" + mode + ")":<22} {result["status"]:>4} '
+                    f'{result["p50_ms"]:>9} {result["p95_ms"]:>9} '
+                    f'{result["p99_ms"]:>9} {result["queries"]:>5} '
+                    f'{result["sql_ms"]:>8} {result["peak_kb"]:>11}'
+                )
+        return {
+            'options': {
+                key: options[key] for key in (
+                    'users', 'posts', 'comments', 'follows', 'seed',
+                    'requests',
+                )
+            },
+            'views': results,
+        }
+
+    def request(self, handler, environ):
+        '''Один запрос с чтением всего ответа, как у WSGI-сервера.'''
+        statuses = []
+        response = handler(
+            dict(environ), lambda status, headers: statuses.append(status)
+        )
+        try:
+            for _ in response:
+                pass
+        finally:
+            response.close()
+        return int(statuses[0].split()[0])
+
+    def measure(self, handler, environ, cold, options):
+        '''
+        Замеры одной страницы. cold - перед каждым запросом кэш
+        очищается, страница строится заново. Память замеряется
+        отдельным запросом: tracemalloc замедляет выполнение.
+        '''
+        for _ in range(options['warmup']):
+            if cold:
+                cache.clear()
+            self.request(handler, environ)
+        counter = QueryCounter()
+        timings = []
+        with connection.execute_wrapper(counter):
+            for _ in range(options['requests']):
+                if cold:
+                    cache.clear()
+                started = time.perf_counter()
+                status = self.request(handler, environ)
+                timings.append((time.perf_counter() - started) * 1000)
+        if cold:
+            cache.clear()
+        tracemalloc.start()
+        try:
+            self.request(handler, environ)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        requests = options['requests']
+        return {
+            'status': status,
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'queries': round(counter.count / requests),
+            'sql_ms': round(counter.seconds * 1000 / requests, 2),
+            'peak_kb': round(peak / 1024),
+        }
@@ -0,0 +1,301 @@
+import io
+import random
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+
+from posts import counters, feed
+from posts.caching import bump
+from posts.models import Comment, Follow, Group, Post, User
+from posts.search import index_deferred
+
+# Даты фиксированы, чтобы набор не зависел от дня запуска
+END = datetime(2022, 1, 1, tzinfo=timezone.utc)
+PASSWORD = 'dataset'
+
+
+def zipf(rnd, count):
+    '''
+    Номер от 0 до count - 1 с вероятностью примерно 1 / (номер + 1):
+    (count + 1) ** u при равномерном u распределено как 1 / x на
+    [1, count + 1). Не требует таблицы весов, поэтому подходит для
+    миллионов записей.
+    '''
+    return min(int((count + 1) ** rnd.random()), count) - 1
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает синтетический набор данных для нагрузочных проверок: '
+        'пользователей, группы, записи (часть с картинками), комментарии '
+        'и подписки со степенным распределением активности. Данные '
+        'пишутся пачками через executemany; при одинаковом --seed на '
+        'пустой базе получается один и тот же набор.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--comments', type=int, default=200_000)
+        parser.add_argument(
+            '--follows', type=int, default=20_000,
+            help='Сколько подписок попытаться создать (повторы и '
+                 'подписки на себя отбрасываются)'
+        )
+        parser.add_argument(
+            '--images', type=float, default=0.1,
+            help='Доля записей с картинкой'
+        )
+        parser.add_argument(
+            '--image-files', type=int, default=20,
+            help='Сколько разных файлов картинок создать'
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней распределить записи'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=10_000,
+            help='Сколько объектов записывать одной транзакцией'
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--no-refresh', action='store_true',
+            help='Не пересчитывать счетчики и ленты подписок'
+        )
+
+    def handle(self, *args, **options):
+        self.rnd = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.batch_size = options['batch_size']
+        self.seed = options['seed']
+        self.start = END - timedelta(days=options['days'])
+        # Тексты собираются из заранее созданных предложений: вызов
+        # Faker на каждую запись занял бы большую часть времени
+        self.sentences = [self.fake.sentence() for _ in range(5000)]
+        if connection.vendor == 'sqlite':
+            # Индексы комментариев и подписок обновляются вразброс,
+            # при маленьком кеше страниц запись упирается в чтение с диска
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA cache_size = -262144')
+
+        user_ids = self.create_users(options['users'])
+        # Самые активные авторы и самые популярные пользователи - разные
+        # люди, иначе ленты подписок разрастаются квадратично
+        self.active = user_ids[:]
+        self.rnd.shuffle(self.active)
+        self.popular = user_ids[:]
+        self.rnd.shuffle(self.popular)
+        group_ids = self.create_groups(options['groups'])
+        images = self.create_images(options['image_files'])
+
+        with index_deferred():
+            first_post, last_post = self.create_posts(
+                options['posts'], group_ids, images, options['images']
+            )
+        self.create_comments(options['comments'], first_post, last_post)
+        self.create_follows(options['follows'])
+
+        if options['no_refresh']:
+            return
+        with transaction.atomic():
+            counters.recount()
+        feed_items = feed.fill_missing()
+        bump('posts', 'display')
+        self.stdout.write(self.style.SUCCESS(
+            f'Счетчики пересчитаны, в ленты добавлено записей: {feed_items}'
+        ))
+
+    def text(self, low, high):
+        return ' '.join(self.rnd.choices(
+            self.sentences, k=self.rnd.randint(low, high)
+        ))
+
+    def date(self, value):
+        return connection.ops.adapt_datetimefield_value(value)
+
+    def insert(self, model, fields, rows):
+        '''
+        Запись строк пачками по batch_size: один executemany в отдельной
+        транзакции. bulk_create тратит большую часть времени на подготовку
+        значений полей, поэтому строки сразу собираются в виде значений
+        для базы. Повторы подписок отбрасываются по unique_together.
+        '''
+        columns = ', '.join(
+            connection.ops.quote_name(model._meta.get_field(field).column)
+            for field in fields
+        )
+        sql = (
+            f'INSERT OR IGNORE INTO {model._meta.db_table} ({columns}) '
+            f'VALUES ({", ".join(["%s"] * len(fields))})'
+        )
+        before = model.objects.count()
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, batch)
+        self.stdout.write(
+            f'{model.__name__}: {model.objects.count() - before}'
+        )
+
+    def next_id(self, model):
+        return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+    def create_users(self, count):
+        '''
+        Имена собираются из заготовок Faker, к логину добавляется id.
+        Хеш пароля считается один раз: вход под любым пользователем
+        с паролем PASSWORD.
+        '''
+        first_id = self.next_id(User)
+        logins = [self.fake.user_name() for _ in range(1000)]
+        first_names = [self.fake.first_name() for _ in range(1000)]
+        last_names = [self.fake.last_name() for _ in range(1000)]
+        password = make_password(PASSWORD)
+        date_joined = self.date(self.start)
+        self.insert(
+            User,
+            (
+                'id', 'password', 'is_superuser', 'username', 'first_name',
+                'last_name', 'email', 'is_staff', 'is_active', 'date_joined',
+            ),
+            (
+                (
+                    user_id, password, False,
+                    f'{self.rnd.choice(logins)}_{user_id}',
+                    self.rnd.choice(first_names),
+                    self.rnd.choice(last_names),
+                    f'user{user_id}@example.com',
+                    False, True, date_joined,
+                )
+                for user_id in range(first_id, first_id + count)
+            )
+        )
+        return list(range(first_id, first_id + count))
+
+    def create_groups(self, count):
+        first_id = self.next_id(Group)
+        self.insert(
+            Group,
+            ('id', 'title', 'slug', 'description'),
+            (
+                (
+                    group_id,
+                    self.fake.sentence(nb_words=3).rstrip('.'),
+                    f'dataset-{self.seed}-{group_id}',
+                    self.text(1, 3),
+                )
+                for group_id in range(first_id, first_id + count)
+            )
+        )
+        return list(range(first_id, first_id + count))
+
+    def create_images(self, count):
+        '''Картинки разных цветов и пропорций для записей.'''
+        names = []
+        for number in range(count):
+            color = tuple(self.rnd.randrange(256) for _ in range(3))
+            size = (self.rnd.randint(400, 1600), self.rnd.randint(300, 1200))
+            buffer = io.BytesIO()
+            Image.new('RGB', size, color).save(buffer, 'JPEG')
+            name = f'posts/dataset_{self.seed}_{number}.jpg'
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            names.append(default_storage.save(
+                name, ContentFile(buffer.getvalue())
+            ))
+        return names
+
+    def post_date(self, number):
+        '''Дата записи по ее номеру: записи идут по возрастанию даты.'''
+        return self.start + self.step * number
+
+    def create_posts(self, count, group_ids, images, image_share):
+        '''
+        Авторы выбираются по закону Ципфа: несколько пользователей пишут
+        большую часть записей. Группы тоже неравномерны, треть записей
+        без группы.
+        '''
+        first_id = self.next_id(Post)
+        self.step = (END - self.start) / max(count, 1)
+
+        def posts():
+            for number in range(count):
+                group_id = None
+                if group_ids and self.rnd.random() > 1 / 3:
+                    group_id = group_ids[zipf(self.rnd, len(group_ids))]
+                image = ''
+                if images and self.rnd.random() < image_share:
+                    image = self.rnd.choice(images)
+                pub_date = self.date(self.post_date(number))
+                yield (
+                    first_id + number,
+                    self.active[zipf(self.rnd, len(self.active))],
+                    group_id,
+                    self.text(1, 8),
+                    image,
+                    pub_date,
+                    pub_date,
+                    0,
+                )
+
+        self.insert(
+            Post,
+            (
+                'id', 'author', 'group', 'text', 'image', 'pub_date',
+                'updated', 'comments_count',
+            ),
+            posts()
+        )
+        return first_id, first_id + count - 1
+
+    def create_comments(self, count, first_post, last_post):
+        '''Больше всего комментариев у свежих записей.'''
+        posts_count = last_post - first_post + 1
+        if posts_count <= 0:
+            return
+
+        def comments():
+            for _ in range(count):
+                number = posts_count - 1 - zipf(self.rnd, posts_count)
+                pub_date = self.post_date(number) + timedelta(
+                    minutes=self.rnd.randint(1, 60 * 24)
+                )
+                yield (
+                    first_post + number,
+                    self.active[zipf(self.rnd, len(self.active))],
+                    self.text(1, 2),
+                    self.date(pub_date),
+                )
+
+        self.insert(
+            Comment, ('post', 'author', 'text', 'pub_date'), comments()
+        )
+
+    def create_follows(self, count):
+        '''Активные пользователи подписываются на популярных.'''
+        if len(self.active) < 2:
+            return
+
+        def follows():
+            for _ in range(count):
+                user_id = self.active[zipf(self.rnd, len(self.active))]
+                author_id = self.popular[zipf(self.rnd, len(self.popular))]
+                if user_id != author_id:
+                    yield user_id, author_id
+
+        self.insert(Follow, ('user', 'author'), follows())
@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.parsers import parse_geometry
+
+from posts import thumbnails
+from posts.models import Post
+
+# Прежняя единственная миниатюра: JPEG с опциями sorl-thumbnail по умолчанию
+BASELINE = ('960x339', {'crop': 'center', 'upscale': True})
+
+
+def encoded_size(source, source_image, geometry, options):
+    '''Размер миниатюры в байтах без записи в хранилище.'''
+    options = thumbnails._thumbnail_options(source, options)
+    ratio = default.engine.get_image_ratio(source_image, options)
+    image = default.engine.create(
+        source_image, parse_geometry(geometry, ratio), options
+    )
+    return len(default.engine._get_raw_data(
+        image,
+        options['format'],
+        options['quality'],
+        image_info=default.engine.get_image_info(source_image),
+        progressive=options.get(
+            'progressive', thumbnail_settings.THUMBNAIL_PROGRESSIVE
+        ),
+    ))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает размер вариантов картинок записей '
+        'с прежней миниатюрой 960x339 на выборке записей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=100,
+            help='Сколько последних записей с картинками взять'
+        )
+
+    def handle(self, *args, **options):
+        images = Post.objects.exclude(image='').values_list(
+            'image', flat=True
+        )[:options['limit']]
+        baseline = 0
+        totals = {
+            (image_format, width): 0
+            for image_format, width, _, _ in thumbnails.variants()
+        }
+        measured = 0
+        for name in images.iterator():
+            source = ImageFile(name, default.storage)
+            try:
+                source_image = default.engine.get_image(source)
+            except OSError as error:
+                self.stderr.write(f'{name}: {error}')
+                continue
+            baseline += encoded_size(source, source_image, *BASELINE)
+            for image_format, width, geometry, variant_options in (
+                thumbnails.variants()
+            ):
+                totals[image_format, width] += encoded_size(
+                    source, source_image, geometry, variant_options
+                )
+            default.engine.cleanup(source_image)
+            measured += 1
+
+        if not measured:
+            self.stdout.write('Нет записей с картинками')
+            return
+        self.stdout.write(f'Картинок: {measured}')
+        self.stdout.write(
+            f'{"вариант":<12} {"байт в среднем":>15} {"от 960x339 JPEG":>16}'
+        )
+        self.stdout.write(
+            f'{"baseline":<12} {baseline // measured:>15} {100:>15.1f}%'
+        )
+        for (image_format, width), total in totals.items():
+            self.stdout.write(
+                f'{image_format.lower() + " " + str(width):<12} '
+                f'{total // measured:>15} '
+                f'{total / baseline * 100:>15.1f}%'
+            )
+        width, _ = settings.POST_IMAGE_SIZE
+        best = min(
+            totals[image_format, width]
+            for image_format in settings.POST_IMAGE_FORMATS
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Экономия на полной ширине: {100 - best / baseline * 100:.1f}%'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import feed
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок (FeedItem) из таблицы подписок.'
+
+    def handle(self, *args, **options):
+        follows_count = feed.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты пересобраны по {follows_count} подпискам'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счетчики записей, комментариев, '
+        'подписчиков и подписок.'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            counters.recount()
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны'))
@@ -0,0 +1,163 @@
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from itertools import accumulate
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+
+from posts.search import CREATE_SQL, match_expression
+
+START = datetime(2020, 1, 1)
+
+SYLLABLES = (
+    'ко', 'ра', 'ми', 'но', 'ту', 'ле', 'са', 'вы', 'де', 'зо',
+    'пи', 'ка', 'ро', 'бу', 'ны', 'ще', 'ла', 'ги', 'мо', 'ст',
+)
+
+# Запросы те же, что строят поиск по записям: icontains из админки
+# и ленты, FTS5 из posts.search. Обе выборки - первая страница и COUNT.
+LIKE_PAGE = (
+    "SELECT id FROM posts_post WHERE text LIKE ? ESCAPE '\\' "
+    'ORDER BY pub_date DESC LIMIT 10'
+)
+LIKE_COUNT = "SELECT COUNT(*) FROM posts_post WHERE text LIKE ? ESCAPE '\\'"
+FTS_PAGE = (
+    'SELECT posts_post.id FROM posts_post, posts_post_fts '
+    'WHERE posts_post_fts.rowid = posts_post.id '
+    'AND posts_post_fts MATCH ? '
+    'ORDER BY posts_post_fts.rank, posts_post.pub_date DESC LIMIT 10'
+)
+FTS_COUNT = (
+    'SELECT COUNT(*) FROM posts_post, posts_post_fts '
+    'WHERE posts_post_fts.rowid = posts_post.id '
+    'AND posts_post_fts MATCH ?'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск по записям через FTS5 с поиском icontains '
+        '(LIKE) на отдельной базе SQLite со сгенерированными записями.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts', type=int, default=1_000_000,
+            help='Количество записей в тестовой базе'
+        )
+        parser.add_argument(
+            '--words', type=int, default=50_000,
+            help='Размер словаря'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Сколько раз повторять каждый запрос'
+        )
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        vocabulary = self.vocabulary(options['words'])
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'search.sqlite3')
+        try:
+            connection = sqlite3.connect(path, isolation_level=None)
+            started = time.perf_counter()
+            self.fill(connection, vocabulary, options['posts'])
+            self.stdout.write(
+                f'Записей: {options["posts"]}, заполнение с индексом: '
+                f'{time.perf_counter() - started:.1f} с'
+            )
+            self.stdout.write(
+                'Найдено записей и время первой страницы с COUNT:'
+            )
+            self.stdout.write(
+                f'{"запрос":<16} {"LIKE":>9} {"FTS5":>9} '
+                f'{"LIKE, мс":>10} {"FTS5, мс":>10} {"ускорение":>10}'
+            )
+            # Частое, среднее и редкое слово по закону Ципфа
+            for rank in (1, len(vocabulary) // 100, len(vocabulary) - 1):
+                self.compare(
+                    connection, vocabulary[rank], options['repeat']
+                )
+            connection.close()
+        finally:
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+            os.rmdir(directory)
+
+    def vocabulary(self, size):
+        words = set()
+        while len(words) < size:
+            words.add(''.join(
+                random.choice(SYLLABLES) for _ in range(random.randint(2, 5))
+            ))
+        return sorted(words, key=lambda word: (len(word), word))
+
+    def fill(self, connection, vocabulary, count):
+        connection.execute(
+            'CREATE TABLE posts_post ('
+            'id INTEGER PRIMARY KEY, text TEXT NOT NULL, '
+            'pub_date DATETIME NOT NULL)'
+        )
+        connection.execute(
+            'CREATE INDEX posts_post_pub_date ON posts_post (pub_date)'
+        )
+        for statement in CREATE_SQL:
+            connection.execute(statement)
+        cum_weights = list(accumulate(
+            1 / rank for rank in range(1, len(vocabulary) + 1)
+        ))
+        batch = 10_000
+        for start in range(0, count, batch):
+            rows = []
+            for number in range(start, min(start + batch, count)):
+                words = random.choices(
+                    vocabulary,
+                    cum_weights=cum_weights,
+                    k=random.randint(5, 60)
+                )
+                rows.append((
+                    number + 1,
+                    ' '.join(words),
+                    (START + timedelta(seconds=number)).isoformat(' '),
+                ))
+            connection.execute('BEGIN')
+            connection.executemany(
+                'INSERT INTO posts_post (id, text, pub_date) '
+                'VALUES (?, ?, ?)',
+                rows
+            )
+            connection.execute('COMMIT')
+
+    def timed(self, connection, repeat, *queries):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = [
+                connection.execute(sql, params).fetchall()
+                for sql, params in queries
+            ]
+            timings.append((time.perf_counter() - started) * 1000)
+        return result, statistics.median(timings)
+
+    def compare(self, connection, word, repeat):
+        pattern = f'%{word}%'
+        like, like_ms = self.timed(
+            connection, repeat,
+            (LIKE_PAGE, (pattern,)), (LIKE_COUNT, (pattern,))
+        )
+        expression = match_expression(word)
+        fts, fts_ms = self.timed(
+            connection, repeat,
+            (FTS_PAGE, (expression,)), (FTS_COUNT, (expression,))
+        )
+        self.stdout.write(
+            f'{word:<16} {like[1][0][0]:>9} {fts[1][0][0]:>9} '
+            f'{like_ms:>10.1f} {fts_ms:>10.1f} '
+            f'{like_ms / fts_ms if fts_ms else 0:>9.1f}x'
+        )
@@ -34,6 +34,16 @@ class Post(StandartModel):
         upload_to='posts/',
         blank=True
     )
+    updated = models.DateTimeField(auto_now=True)
+    comments_count = models.PositiveIntegerField(default=0)
+
+    class Meta(StandartModel.Meta):
+        # Записи автора и группы выбираются по убыванию (pub_date, id):
+        # индекс читается с конца, id в нем неявно последний
+        indexes = [
+            models.Index(fields=['author', 'pub_date']),
+            models.Index(fields=['group', 'pub_date']),
+        ]
 
 
 class Comment(StandartModel):
@@ -49,6 +59,11 @@ class Comment(StandartModel):
         related_name='comments'
     )
 
+    class Meta(StandartModel.Meta):
+        indexes = [
+            models.Index(fields=['post', 'pub_date']),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -64,3 +79,48 @@ class Follow(models.Model):
 
     class Meta:
         unique_together = ('user', 'author',)
+        # Подписчики автора (рассылка в ленты) без чтения таблицы
+        indexes = [
+            models.Index(fields=['author', 'user']),
+        ]
+
+
+class UserStats(models.Model):
+    '''Счетчики пользователя, обновляемые при записи (posts.counters).'''
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+
+class FeedItem(models.Model):
+    '''Запись в ленте подписок пользователя (заполняется при записи).'''
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_items'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'post',)
+        # Лента читается по индексу в порядке (pub_date, post) без сортировки
+        indexes = [
+            models.Index(fields=['user', 'pub_date', 'post']),
+            models.Index(fields=['user', 'author']),
+        ]
@@ -0,0 +1,91 @@
+import re
+from contextlib import contextmanager
+
+from django.db import connection
+
+# Полнотекстовый индекс FTS5 по тексту записей. Индекс хранит только
+# токены (content=posts_post), сам текст берется из таблицы записей;
+# триггеры держат его в актуальном состоянии при любых изменениях,
+# в том числе массовых и минующих ORM.
+CREATE_SQL = (
+    '''
+    CREATE VIRTUAL TABLE posts_post_fts USING fts5(
+        text,
+        content='posts_post',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    ''',
+    '''
+    CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts (rowid, text) VALUES (new.id, new.text);
+    END
+    ''',
+    '''
+    CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN
+        INSERT INTO posts_post_fts (posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    ''',
+    '''
+    CREATE TRIGGER posts_post_fts_update AFTER UPDATE OF text ON posts_post
+    BEGIN
+        INSERT INTO posts_post_fts (posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO posts_post_fts (rowid, text) VALUES (new.id, new.text);
+    END
+    ''',
+    "INSERT INTO posts_post_fts (posts_post_fts) VALUES ('rebuild')",
+)
+
+DROP_SQL = (
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    'DROP TABLE IF EXISTS posts_post_fts',
+)
+
+
+@contextmanager
+def index_deferred():
+    '''
+    Индекс удаляется на время массовой загрузки записей и строится
+    заново одним проходом ('rebuild'): это примерно вдвое быстрее, чем
+    обновлять его триггером на каждую строку.
+    '''
+    with connection.cursor() as cursor:
+        for statement in DROP_SQL:
+            cursor.execute(statement)
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for statement in CREATE_SQL:
+                cursor.execute(statement)
+
+
+def match_expression(query):
+    '''
+    Запрос FTS5 из пользовательской строки: каждое слово в кавычках
+    и с поиском по началу слова, слова объединяются через AND.
+    Синтаксис FTS5 из строки пользователя не передается.
+    '''
+    words = re.findall(r'\w+', query.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_posts(queryset, query):
+    '''Записи, подходящие под запрос, от более релевантных (bm25).'''
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    return queryset.extra(
+        tables=['posts_post_fts'],
+        where=[
+            'posts_post_fts.rowid = posts_post.id',
+            'posts_post_fts MATCH %s',
+        ],
+        params=[expression],
+        select={'rank': 'posts_post_fts.rank'},
+        order_by=['rank', '-pub_date'],
+    )
@@ -0,0 +1,183 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from core import jobs
+
+from . import counters, feed, thumbnails
+from .caching import bump_on_commit, post_scopes
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_posts_counts(sender, **kwargs):
+    '''Сброс закэшированных количеств записей при изменении выборок.'''
+    bump_on_commit('posts')
+
+
+@receiver(post_init, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    '''Запоминаем исходную группу, чтобы при смене сбросить обе.'''
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    '''Сброс страниц со списками, где показывается запись.'''
+    bump_on_commit(*post_scopes(instance))
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    '''Сброс страниц записи, к которой относится комментарий.'''
+    bump_on_commit(*post_scopes(instance.post))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_page(sender, instance, **kwargs):
+    '''Сброс страницы группы и всех страниц с ее названием.'''
+    bump_on_commit(f'group:{instance.slug}', 'display')
+
+
+# Поля пользователя, которые показываются на страницах
+USER_DISPLAY_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def _display_names(user):
+    # Через __dict__, чтобы не загружать отложенные поля (only/defer)
+    return tuple(user.__dict__.get(field) for field in USER_DISPLAY_FIELDS)
+
+
+@receiver(post_init, sender=User)
+def remember_user_names(sender, instance, **kwargs):
+    '''Запоминаем показываемые имена, чтобы сбрасывать кэш при смене.'''
+    instance._loaded_names = _display_names(instance)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_pages(sender, instance, created, **kwargs):
+    '''
+    Сброс страниц с именем пользователя при его изменении. Новый
+    пользователь еще нигде не показан, смена пароля и отметка о входе
+    страниц не меняют.
+    '''
+    names = _display_names(instance)
+    if not created and names != instance._loaded_names:
+        bump_on_commit('display')
+    instance._loaded_names = names
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user_pages(sender, instance, **kwargs):
+    bump_on_commit('display')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_profile_page(sender, instance, **kwargs):
+    '''
+    Сброс профилей автора и подписчика (количества подписчиков
+    и подписок) и ленты подписчика.
+    '''
+    bump_on_commit(
+        f'author:{instance.author.username}',
+        f'author:{instance.user.username}',
+        f'feed:{instance.user_id}'
+    )
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    '''Рассылка новой записи по лентам подписчиков.'''
+    if created:
+        jobs.enqueue(
+            feed.fan_out_post,
+            instance.id,
+            queue='feed',
+            key=f'fan_out:{instance.id}'
+        )
+
+
+def _image_name(post):
+    # Через __dict__, чтобы не загружать отложенное поле (only/defer)
+    image = post.__dict__.get('image')
+    return getattr(image, 'name', image)
+
+
+@receiver(post_init, sender=Post)
+def remember_post_image(sender, instance, **kwargs):
+    '''Запоминаем исходную картинку, чтобы создавать миниатюры при смене.'''
+    instance._loaded_image = _image_name(instance)
+
+
+@receiver(post_save, sender=Post)
+def schedule_thumbnails(sender, instance, created, **kwargs):
+    '''
+    Создание миниатюр в фоне для новой записи или новой картинки.
+    Правка текста записи миниатюры заново не ставит.
+    '''
+    image = _image_name(instance)
+    if image and (created or image != instance._loaded_image):
+        transaction.on_commit(lambda: thumbnails.schedule(instance))
+    instance._loaded_image = image
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def sync_feed(sender, instance, created=True, **kwargs):
+    '''Заполнение ленты после подписки и очистка после отписки.'''
+    if not created:
+        return
+    jobs.enqueue(
+        feed.sync_follow,
+        instance.user_id,
+        instance.author_id,
+        queue='feed',
+        key=f'follow:{instance.user_id}:{instance.author_id}'
+    )
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, **kwargs):
+    '''Заведение счетчиков нового пользователя.'''
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def count_posts(sender, instance, created=True, **kwargs):
+    '''Счетчик записей автора.'''
+    # post_delete не передает created: удаление учитывается всегда
+    if not created:
+        return
+    delta = -1 if kwargs['signal'] is post_delete else 1
+    counters.change_user_stats(instance.author_id, posts_count=delta)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def count_comments(sender, instance, created=True, **kwargs):
+    '''Счетчик комментариев записи.'''
+    if not created:
+        return
+    delta = -1 if kwargs['signal'] is post_delete else 1
+    counters.change_comments_count(instance.post_id, delta)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def count_follows(sender, instance, created=True, **kwargs):
+    '''Счетчики подписчиков автора и подписок пользователя.'''
+    if not created:
+        return
+    delta = -1 if kwargs['signal'] is post_delete else 1
+    counters.change_user_stats(instance.author_id, followers_count=delta)
+    counters.change_user_stats(instance.user_id, following_count=delta)
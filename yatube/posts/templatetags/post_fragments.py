@@ -0,0 +1,47 @@
+from hashlib import md5
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+
+def fragment_key(post, view_name):
+    '''
+    Ключ фрагмента записи. Версия включает время последнего изменения
+    записи, количество комментариев и отображаемые данные автора
+    и группы, поэтому их правка сама по себе дает новый ключ.
+    '''
+    version = [
+        post.updated.isoformat(),
+        str(post.comments_count),
+        post.author.username,
+        post.author.get_full_name(),
+        post.image.name,
+    ]
+    if post.group_id:
+        version += [post.group.slug, post.group.title]
+    digest = md5('\n'.join(version).encode()).hexdigest()
+    return f'post-fragment:{view_name}:{post.id}:{digest}'
+
+
+@register.simple_tag(takes_context=True)
+def post_fragments(context, posts):
+    '''Отрисованные записи страницы из кэша фрагментов.'''
+    view_name = context['request'].resolver_match.view_name
+    keys = [fragment_key(post, view_name) for post in posts]
+    fragments = cache.get_many(keys)
+    missing = {}
+    fragment_template = get_template('posts/includes/post.html')
+    for post, key in zip(posts, keys):
+        if key not in fragments:
+            missing[key] = fragment_template.render(
+                {'post': post, 'view_name': view_name}
+            )
+    if missing:
+        cache.set_many(missing, settings.POST_FRAGMENT_CACHE_TIMEOUT)
+        fragments.update(missing)
+    return [mark_safe(fragments[key]) for key in keys]
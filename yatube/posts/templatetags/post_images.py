@@ -0,0 +1,34 @@
+from django import template
+from django.conf import settings
+
+from core import timing
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/post_image.html')
+def post_image(image, sizes=None):
+    '''
+    Картинка записи с вариантами разной ширины и формата (srcset).
+    Варианты создаются в фоне, а не при отрисовке страницы:
+    пока их нет, показывается заглушка.
+    '''
+    width, height = settings.POST_IMAGE_SIZE
+    with timing.span('thumbnails'):
+        ready = thumbnails.ready_variants(image)
+    context = {
+        'width': width,
+        'height': height,
+        'sizes': sizes or settings.POST_IMAGE_SIZES,
+        'sources': [],
+        'fallback': None,
+    }
+    if ready:
+        *modern, fallback = settings.POST_IMAGE_FORMATS
+        context['sources'] = [
+            (f'image/{image_format.lower()}', ready[image_format])
+            for image_format in modern
+        ]
+        context['fallback'] = ready[fallback]
+    return context
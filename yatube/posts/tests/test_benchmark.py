@@ -0,0 +1,78 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+
+class PostsBenchmarkTests(TestCase):
+    '''Тестирование замеров страниц.'''
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command(
+            'generate_dataset', '--users', '20', '--groups', '2',
+            '--posts', '50', '--comments', '50', '--follows', '50',
+            '--image-files', '0', stdout=StringIO()
+        )
+
+    def benchmark(self, *args):
+        stdout = StringIO()
+        call_command(
+            'benchmark_views', '--db', '-', '--requests', '2',
+            '--warmup', '0', *args, stdout=stdout
+        )
+        return stdout.getvalue()
+
+    def test_benchmark_views(self):
+        '''Все читающие страницы замеряются и отвечают 200.'''
+        handle, path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        try:
+            self.benchmark('--output', path)
+            with open(path, encoding='utf-8') as file:
+                views = json.load(file)['views']
+        finally:
+            os.remove(path)
+        for name in ('index', 'group_list', 'profile', 'post_detail',
+                     'search', 'follow_index'):
+            for mode in ('cold', 'warm'):
+                with self.subTest(name=name, mode=mode):
+                    result = views[f'{name} ({mode})']
+                    self.assertEqual(result['status'], 200)
+                    # Из кэша, вместе с сессией и пользователем, страница
+                    # может строиться вовсе без запросов
+                    if mode == 'cold':
+                        self.assertGreater(result['queries'], 0)
+                    self.assertLessEqual(
+                        result['p50_ms'], result['p99_ms']
+                    )
+        self.assertNotIn('profile_follow (cold)', views)
+        # Из кэша страница строится меньшим числом запросов
+        self.assertLess(
+            views['index (warm)']['queries'],
+            views['index (cold)']['queries']
+        )
+
+    def test_benchmark_views_baseline(self):
+        '''Рост числа запросов относительно базового прогона - ошибка.'''
+        handle, path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        try:
+            self.benchmark('--output', path)
+            with open(path, encoding='utf-8') as file:
+                baseline = json.load(file)
+            baseline['views']['index (cold)']['queries'] -= 1
+            # Время на маленькой базе шумит, сравнивается только SQL
+            for result in baseline['views'].values():
+                result['p95_ms'] = result['peak_kb'] = 10 ** 6
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump(baseline, file)
+            with self.assertRaisesMessage(CommandError, 'index (cold)'):
+                self.benchmark('--baseline', path)
+        finally:
+            os.remove(path)
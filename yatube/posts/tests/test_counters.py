@@ -0,0 +1,106 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+
+from posts.models import Comment, Post, User, UserStats
+
+
+class PostsCountersTests(TestCase):
+    '''Тестирование денормализованных счетчиков.'''
+
+    @classmethod
+    def setUpClass(cls):
+        '''Создание автора и подписчика.'''
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+        cls.user = User.objects.create_user(username='reader')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_write_paths(self):
+        '''Счетчики меняются вместе с записями, комментариями, подписками.'''
+        PostsCountersTests.author_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Новая запись'}
+        )
+        post = Post.objects.get(author=PostsCountersTests.author)
+        self.assertEqual(self.stats(PostsCountersTests.author).posts_count, 1)
+
+        PostsCountersTests.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.id}),
+            data={'text': 'Комментарий'}
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+        follow_url = reverse(
+            'posts:profile_follow',
+            kwargs={'username': PostsCountersTests.author.username}
+        )
+        PostsCountersTests.authorized_client.get(follow_url)
+        PostsCountersTests.authorized_client.get(follow_url)
+        self.assertEqual(
+            self.stats(PostsCountersTests.author).followers_count, 1
+        )
+        self.assertEqual(
+            self.stats(PostsCountersTests.user).following_count, 1
+        )
+        PostsCountersTests.authorized_client.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': PostsCountersTests.author.username}
+        ))
+        self.assertEqual(
+            self.stats(PostsCountersTests.author).followers_count, 0
+        )
+
+        Comment.objects.get(post=post).delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(PostsCountersTests.author).posts_count, 0)
+
+    def test_counters_recount_command(self):
+        '''Команда recount_stats исправляет разошедшиеся счетчики.'''
+        post = Post.objects.create(
+            author=PostsCountersTests.author,
+            text='Запись'
+        )
+        Comment.objects.create(
+            author=PostsCountersTests.user,
+            post=post,
+            text='Комментарий'
+        )
+        UserStats.objects.update(posts_count=10)
+        Post.objects.update(comments_count=10)
+        call_command('recount_stats', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(PostsCountersTests.author).posts_count, 1)
+        self.assertEqual(self.stats(PostsCountersTests.user).posts_count, 0)
+
+    def test_counters_not_below_zero(self):
+        '''Разошедшийся счетчик при уменьшении не становится меньше нуля.'''
+        post = Post.objects.create(
+            author=PostsCountersTests.author,
+            text='Запись'
+        )
+        comment = Comment.objects.create(
+            author=PostsCountersTests.user,
+            post=post,
+            text='Комментарий'
+        )
+        UserStats.objects.update(posts_count=0)
+        Post.objects.update(comments_count=0)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(PostsCountersTests.author).posts_count, 0)
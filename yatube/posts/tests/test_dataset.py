@@ -0,0 +1,71 @@
+import random
+from collections import Counter
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from posts.management.commands.generate_dataset import zipf
+from posts.models import Comment, FeedItem, Follow, Group, Post, User
+from posts.search import search_posts
+
+
+class PostsDatasetTests(TestCase):
+    '''Тестирование генератора синтетических данных.'''
+
+    def generate(self):
+        call_command(
+            'generate_dataset', '--users', '50', '--groups', '3',
+            '--posts', '500', '--comments', '300', '--follows', '200',
+            '--image-files', '0', '--batch-size', '100', '--seed', '7',
+            stdout=StringIO()
+        )
+        return (
+            list(Post.objects.order_by('id').values_list(
+                'author__username', 'group__slug', 'text', 'pub_date'
+            )),
+            list(Comment.objects.order_by('id').values_list(
+                'post_id', 'author__username', 'text'
+            )),
+            set(Follow.objects.values_list(
+                'user__username', 'author__username'
+            )),
+        )
+
+    def test_generate_dataset(self):
+        '''Объемы, степенное распределение и пересчет лент.'''
+        posts, comments, follows = self.generate()
+        self.assertEqual(User.objects.count(), 50)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(len(posts), 500)
+        self.assertEqual(len(comments), 300)
+        self.assertTrue(follows)
+        # Самый активный автор пишет в разы больше среднего
+        authors = Counter(author for author, *_ in posts)
+        self.assertGreater(authors.most_common(1)[0][1], 5 * 500 / 50)
+        self.assertEqual(
+            FeedItem.objects.count(),
+            Post.objects.filter(author__following__isnull=False).count()
+        )
+        post = Post.objects.order_by('id').first()
+        word = post.text.split()[0]
+        self.assertIn(post, search_posts(Post.objects.all(), word))
+
+    def test_generate_dataset_seed(self):
+        '''Одинаковый seed на пустой базе дает одинаковые данные.'''
+        first = self.generate()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.assertEqual(self.generate(), first)
+
+
+class ZipfTests(SimpleTestCase):
+    '''Тестирование выбора номера со степенным распределением.'''
+
+    def test_zipf_range(self):
+        '''Выпадают все номера от 0 до count - 1, чаще - первые.'''
+        rnd = random.Random(1)
+        numbers = Counter(zipf(rnd, 5) for _ in range(5000))
+        self.assertEqual(set(numbers), set(range(5)))
+        self.assertGreater(numbers[0], numbers[4])
+        self.assertEqual({zipf(rnd, 1) for _ in range(100)}, {0})
@@ -0,0 +1,111 @@
+import io
+import json
+import shutil
+import tempfile
+import zipfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+
+from posts.models import Comment, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, EXPORT_CHUNK_SIZE=2)
+class PostsExportTests(TestCase):
+    '''Тестирование потоковой выгрузки данных пользователя.'''
+
+    @classmethod
+    def setUpClass(cls):
+        '''Создание автора с записями, картинкой и комментарием.'''
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f'Запись {count}')
+            for count in range(3)
+        ]
+        cls.image_post = Post.objects.create(
+            author=cls.author,
+            text='С картинкой',
+            image=SimpleUploadedFile(
+                name='small.gif',
+                content=SMALL_GIF,
+                content_type='image/gif'
+            ),
+        )
+        Comment.objects.create(
+            author=cls.author, post=cls.posts[0], text='Комментарий'
+        )
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin'
+        )
+        cls.admin_client = Client()
+        cls.admin_client.force_login(cls.admin)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_export_ndjson(self):
+        '''Выгрузка NDJSON идет потоком и содержит все записи.'''
+        response = PostsExportTests.author_client.get(
+            reverse('posts:export'), {'format': 'ndjson'}
+        )
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(
+            [record['type'] for record in records],
+            ['post'] * 4 + ['comment']
+        )
+        self.assertEqual(records[3]['image'], 'posts/small.gif')
+
+    def test_export_zip(self):
+        '''ZIP содержит content.ndjson и файлы картинок.'''
+        response = PostsExportTests.author_client.get(
+            reverse('posts:export'), {'format': 'zip'}
+        )
+        archive = zipfile.ZipFile(
+            io.BytesIO(b''.join(response.streaming_content))
+        )
+        self.assertEqual(
+            archive.namelist(), ['content.ndjson', 'posts/small.gif']
+        )
+        self.assertEqual(archive.read('posts/small.gif'), SMALL_GIF)
+        self.assertEqual(
+            len(archive.read('content.ndjson').splitlines()), 5
+        )
+
+    def test_export_requires_login(self):
+        '''Гость перенаправляется на страницу входа.'''
+        response = self.client.get(reverse('posts:export'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_export_admin_action(self):
+        '''Действие админки выгружает выбранного пользователя.'''
+        response = PostsExportTests.admin_client.post(
+            reverse('admin:auth_user_changelist'),
+            {
+                'action': 'export_content',
+                '_selected_action': [PostsExportTests.author.pk],
+            }
+        )
+        archive = zipfile.ZipFile(
+            io.BytesIO(b''.join(response.streaming_content))
+        )
+        self.assertIn('content.ndjson', archive.namelist())
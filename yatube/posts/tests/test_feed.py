@@ -0,0 +1,60 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+
+
+from posts.models import FeedItem, Follow, Post, User
+
+
+@override_settings(FEED_BATCH_SIZE=2)
+class PostsFeedTests(TransactionTestCase):
+    '''
+    Тестирование материализованной ленты подписок. Ленты заполняются
+    после фиксации транзакции, поэтому TransactionTestCase.
+    '''
+
+    def setUp(self):
+        '''Создание подписчика и автора с несколькими записями.'''
+        self.user = User.objects.create_user(username='reader')
+        self.author = User.objects.create_user(username='author')
+        self.posts = [
+            Post.objects.create(author=self.author, text=f'Запись {count}')
+            for count in range(5)
+        ]
+
+    def feed_post_ids(self):
+        return set(
+            FeedItem.objects.filter(
+                user=self.user
+            ).values_list('post_id', flat=True)
+        )
+
+    def test_feed_follow_and_unfollow(self):
+        '''Подписка заполняет ленту, отписка очищает.'''
+        follow = Follow.objects.create(
+            user=self.user,
+            author=self.author
+        )
+        self.assertEqual(
+            self.feed_post_ids(),
+            {post.id for post in self.posts}
+        )
+        new_post = Post.objects.create(
+            author=self.author,
+            text='Новая запись'
+        )
+        self.assertIn(new_post.id, self.feed_post_ids())
+        follow.delete()
+        self.assertEqual(self.feed_post_ids(), set())
+
+    def test_feed_rebuild_command(self):
+        '''Команда rebuild_feed восстанавливает ленты из подписок.'''
+        Follow.objects.create(
+            user=self.user,
+            author=self.author
+        )
+        expected = self.feed_post_ids()
+        FeedItem.objects.filter(post=self.posts[0]).delete()
+        call_command('rebuild_feed', stdout=StringIO())
+        self.assertEqual(self.feed_post_ids(), expected)
@@ -1,6 +1,5 @@
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
-from django.conf import settings
 from django.urls import reverse
 
 
@@ -11,7 +10,7 @@ import tempfile
 from posts.models import Group, Post, Comment, User
 
 
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -0,0 +1,107 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+
+from posts.models import (
+    Comment,
+    FeedItem,
+    Follow,
+    Group,
+    Post,
+    User,
+    UserStats
+)
+
+
+class PostsImportTests(TestCase):
+    '''Тестирование массовой загрузки содержимого.'''
+
+    @classmethod
+    def setUpClass(cls):
+        '''Создание пользователей и группы, на которые ссылается файл.'''
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+
+    def load(self, suffix, content, *args):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w', encoding='utf-8') as file:
+            file.write(content)
+        stdout, stderr = StringIO(), StringIO()
+        try:
+            call_command(
+                'import_content', path, '--batch-size', '2', *args,
+                stdout=stdout, stderr=stderr
+            )
+        finally:
+            os.remove(path)
+        return stderr.getvalue()
+
+    def test_import_ndjson(self):
+        '''Записи, комментарии и подписки из NDJSON с пересчетом.'''
+        rows = [
+            {'type': 'post', 'id': 100, 'author': 'author',
+             'group': 'test_slug', 'text': 'Старая запись',
+             'pub_date': '2015-05-01T10:00:00+00:00'},
+            {'type': 'post', 'id': 101, 'author': 'author',
+             'text': 'Еще одна запись'},
+            {'type': 'post', 'author': 'nobody', 'text': 'Без автора'},
+            {'type': 'comment', 'post': 100, 'author': 'reader',
+             'text': 'Комментарий'},
+            {'type': 'comment', 'post': 999, 'author': 'reader',
+             'text': 'К несуществующей записи'},
+            {'type': 'follow', 'user': 'reader', 'author': 'author'},
+        ]
+        errors = self.load(
+            '.ndjson',
+            '\n'.join(json.dumps(row) for row in rows) + '\n\n{broken\n'
+        )
+        self.assertEqual(errors.count('\n'), 3)
+        old_post = Post.objects.get(id=100)
+        self.assertEqual(old_post.pub_date.year, 2015)
+        self.assertEqual(old_post.group, PostsImportTests.group)
+        self.assertEqual(old_post.comments_count, 1)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertTrue(Follow.objects.filter(
+            user=PostsImportTests.reader, author=PostsImportTests.author
+        ).exists())
+        self.assertEqual(
+            UserStats.objects.get(user=PostsImportTests.author).posts_count,
+            2
+        )
+        self.assertEqual(
+            set(FeedItem.objects.filter(
+                user=PostsImportTests.reader
+            ).values_list('post_id', flat=True)),
+            {100, 101}
+        )
+        # Поле снова заполняется само при обычном сохранении
+        post = Post.objects.create(
+            author=PostsImportTests.author, text='Новая'
+        )
+        self.assertIsNotNone(post.pub_date)
+
+    def test_import_csv(self):
+        '''Записи из CSV с указанием типа строк.'''
+        self.load(
+            '.csv',
+            'author,group,text\n'
+            'author,test_slug,Первая\n'
+            'author,,Вторая\n'
+            'author,,Третья\n',
+            '--type', 'post'
+        )
+        self.assertEqual(
+            sorted(Post.objects.values_list('text', flat=True)),
+            ['Вторая', 'Первая', 'Третья']
+        )
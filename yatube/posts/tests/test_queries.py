@@ -0,0 +1,103 @@
+from django.core.cache import cache
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+# Допустимое количество SQL-запросов на страницу для каждого URL.
+# Число не должно зависеть от количества записей на странице:
+# превышение бюджета означает, что в шаблоне появились запросы на строку.
+# В бюджет входят запросы сессии и пользователя (2 запроса).
+QUERY_BUDGETS = {
+    'posts:index': 4,
+    'posts:group_list': 5,
+    'posts:profile': 6,
+    'posts:post_detail': 5,
+    'posts:follow_index': 4,
+}
+
+
+class PostsQueriesTests(TestCase):
+    '''Тестирование количества SQL-запросов на страницах posts.'''
+
+    @classmethod
+    def setUpClass(cls):
+        '''
+        Создание подписчика, нескольких авторов и групп
+        и полной страницы записей.
+        '''
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.author = User.objects.create_user(username='author')
+        for count in range(settings.POSTS_PER_PAGE_LIMIT):
+            author = User.objects.create_user(
+                username=f'author_{count}',
+                first_name=f'Имя {count}',
+            )
+            Follow.objects.create(user=cls.user, author=author)
+            group = Group.objects.create(
+                title=f'Группа {count}',
+                slug=f'slug_{count}',
+                description='Описание',
+            )
+            Post.objects.create(author=author, group=group, text='Запись')
+            post = Post.objects.create(
+                author=cls.author,
+                group=cls.group,
+                text=f'Запись {count}',
+            )
+        cls.post = post
+        for count in range(settings.POSTS_PER_PAGE_LIMIT):
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.get(username=f'author_{count}'),
+                text=f'Комментарий {count}',
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_posts_query_budget(self):
+        '''Тест на отсутствие запросов к БД для каждой записи на странице.'''
+        urls = {
+            'posts:index': reverse('posts:index'),
+            'posts:group_list': reverse(
+                'posts:group_list',
+                kwargs={'slug': PostsQueriesTests.group.slug}
+            ),
+            'posts:profile': reverse(
+                'posts:profile',
+                kwargs={'username': PostsQueriesTests.author.username}
+            ),
+            'posts:post_detail': reverse(
+                'posts:post_detail',
+                kwargs={'post_id': PostsQueriesTests.post.id}
+            ),
+            'posts:follow_index': reverse('posts:follow_index'),
+        }
+        for url_name, url in urls.items():
+            with self.subTest(url_name=url_name):
+                # Первый запрос прогревает сессию и кэши
+                self.authorized_client.get(url)
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.authorized_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(
+                    len(queries),
+                    QUERY_BUDGETS[url_name],
+                    f'Страница {url_name} превысила бюджет запросов:\n'
+                    + '\n'.join(query['sql'] for query in queries)
+                )
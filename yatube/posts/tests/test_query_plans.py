@@ -0,0 +1,108 @@
+import re
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.utils import encode_cursor
+
+# Полный проход таблицы (без индекса) или сортировка результата
+# во временном B-дереве вместо чтения индекса по порядку
+BAD_PLAN = re.compile(r'^SCAN (?!.*\bINDEX\b)|USE TEMP B-TREE')
+
+
+class PostsQueryPlansTests(TestCase):
+    '''
+    Тестирование планов SQL-запросов горячих страниц: каждая выборка
+    должна идти по индексу в нужном порядке, без сортировки.
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.post = Post.objects.create(
+            author=cls.author,
+            group=cls.group,
+            text='Тестовая запись',
+        )
+        cls.comment = Comment.objects.create(
+            post=cls.post,
+            author=cls.user,
+            text='Тестовый комментарий',
+        )
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def plan(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_hot_pages_use_indexes(self):
+        '''Тест на отсутствие полных проходов таблиц и сортировок.'''
+        post = PostsQueryPlansTests.post
+        before = urlencode({'before': encode_cursor(post)})
+        after = urlencode({'after': encode_cursor(
+            PostsQueryPlansTests.comment
+        )})
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:index') + '?page=1',
+            reverse('posts:index') + f'?{before}',
+            reverse(
+                'posts:group_list',
+                kwargs={'slug': PostsQueryPlansTests.group.slug}
+            ),
+            reverse(
+                'posts:group_list',
+                kwargs={'slug': PostsQueryPlansTests.group.slug}
+            ) + f'?{before}',
+            reverse(
+                'posts:profile',
+                kwargs={'username': PostsQueryPlansTests.author.username}
+            ),
+            reverse(
+                'posts:profile',
+                kwargs={'username': PostsQueryPlansTests.author.username}
+            ) + f'?{before}',
+            reverse('posts:post_detail', kwargs={'post_id': post.id}),
+            reverse('posts:post_comments', kwargs={'post_id': post.id})
+            + f'?{after}',
+            reverse('posts:post_comments', kwargs={'post_id': post.id})
+            + f'?order=oldest&{after}',
+            reverse('posts:follow_index'),
+            reverse('posts:follow_index') + f'?{before}',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.authorized_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                selects = [
+                    query['sql'] for query in queries
+                    if query['sql'].startswith('SELECT')
+                ]
+                self.assertTrue(selects)
+                for sql in selects:
+                    # Параметры уже подставлены в текст запроса
+                    plan = self.plan(sql, ())
+                    self.assertFalse(
+                        [step for step in plan if BAD_PLAN.search(step)],
+                        f'{sql}\n' + '\n'.join(plan)
+                    )
@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.test import Client, TestCase
+from django.urls import reverse
+
+
+from posts.models import Post, User
+
+
+class PostsSearchTests(TestCase):
+    '''Тестирование полнотекстового поиска по записям.'''
+
+    @classmethod
+    def setUpClass(cls):
+        '''Создание автора, администратора и записей.'''
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin'
+        )
+        cls.admin_client = Client()
+        cls.admin_client.force_login(cls.admin)
+        cls.rare = Post.objects.create(
+            author=cls.author,
+            text='Длинная запись про котов, где кот упомянут один раз'
+        )
+        cls.often = Post.objects.create(
+            author=cls.author,
+            text='Кот. Кот и кот'
+        )
+        cls.other = Post.objects.create(
+            author=cls.author,
+            text='Запись про собак'
+        )
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return [post.id for post in response.context['page_obj']]
+
+    def test_search_ranked_results(self):
+        '''Результаты упорядочены по релевантности, регистр не важен.'''
+        self.assertEqual(
+            self.search('КОТ'),
+            [PostsSearchTests.often.id, PostsSearchTests.rare.id]
+        )
+        # Поиск по началу слова
+        self.assertEqual(self.search('соба'), [PostsSearchTests.other.id])
+        # Синтаксис FTS5 из запроса не выполняется
+        self.assertEqual(self.search('кот" OR "собак'), [])
+        self.assertEqual(self.search(''), [])
+
+    def test_search_index_follows_changes(self):
+        '''Индекс обновляется при изменении и удалении записей.'''
+        post = Post.objects.get(id=PostsSearchTests.other.id)
+        post.text = 'Теперь про хомяков'
+        post.save()
+        self.assertEqual(self.search('собак'), [])
+        self.assertEqual(self.search('хомяков'), [post.id])
+        post.delete()
+        self.assertEqual(self.search('хомяков'), [])
+
+    def test_search_pagination(self):
+        '''Ссылки на страницы результатов сохраняют запрос.'''
+        Post.objects.bulk_create(
+            Post(author=PostsSearchTests.author, text=f'Кот {count}')
+            for count in range(settings.POSTS_PER_PAGE_LIMIT)
+        )
+        response = self.client.get(reverse('posts:search'), {'q': 'кот'})
+        self.assertIn(b'?q=%D0%BA%D0%BE%D1%82&amp;page=2', response.content)
+
+    def test_search_admin(self):
+        '''Поиск в админке идет по полнотекстовому индексу.'''
+        response = PostsSearchTests.admin_client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собак'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list),
+            [PostsSearchTests.other]
+        )
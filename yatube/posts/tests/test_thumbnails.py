@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+
+from posts import thumbnails
+from posts.models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostsThumbnailsTests(TestCase):
+    '''Тестирование массового создания вариантов картинок.'''
+
+    @classmethod
+    def setUpClass(cls):
+        '''Создание записей с картинками и без.'''
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author,
+                text=f'Запись {count}',
+                image=SimpleUploadedFile(
+                    name=f'small{count}.gif',
+                    content=SMALL_GIF,
+                    content_type='image/gif'
+                ),
+            )
+            for count in range(3)
+        ]
+        Post.objects.create(author=cls.author, text='Без картинки')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.checkpoint = os.path.join(TEMP_MEDIA_ROOT, 'checkpoint.txt')
+        if os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+
+    def backfill(self, *args):
+        call_command(
+            'backfill_thumbnails',
+            '--processes', '0',
+            '--checkpoint', self.checkpoint,
+            *args,
+            stdout=StringIO()
+        )
+
+    def test_backfill_thumbnails_command(self):
+        '''Команда создает варианты всех картинок и продолжает с места.'''
+        first, second, third = PostsThumbnailsTests.posts
+        with open(self.checkpoint, 'w') as file:
+            file.write(str(first.id))
+        self.backfill()
+        self.assertIsNone(thumbnails.ready_variants(first.image))
+        self.assertIsNotNone(thumbnails.ready_variants(second.image))
+        self.assertIsNotNone(thumbnails.ready_variants(third.image))
+        with open(self.checkpoint) as file:
+            self.assertEqual(file.read(), str(third.id))
+
+        self.backfill('--restart')
+        self.assertIsNotNone(thumbnails.ready_variants(first.image))
+
+    def test_thumbnails_scheduled_on_image_change(self):
+        '''Миниатюры ставятся для новой картинки, но не при правке текста.'''
+        post = Post.objects.get(id=PostsThumbnailsTests.posts[0].id)
+        with mock.patch('posts.signals.transaction') as transaction:
+            post.text = 'Новый текст'
+            post.save()
+            transaction.on_commit.assert_not_called()
+            post.image = SimpleUploadedFile(
+                name='other.gif',
+                content=SMALL_GIF,
+                content_type='image/gif'
+            )
+            post.save()
+            transaction.on_commit.assert_called_once()
+            post.save()
+            transaction.on_commit.assert_called_once()
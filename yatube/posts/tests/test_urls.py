@@ -132,6 +132,18 @@ class PostsURLsTests(TestCase):
                 False,
                 HTTPStatus.OK
             ),
+            (
+                f'/posts/{PostsURLsTests.post.id}/comments/',
+                PostsURLsTests.guest_client,
+                False,
+                HTTPStatus.OK
+            ),
+            (
+                '/posts/0/comments/',  # Комментарии несуществующей записи
+                PostsURLsTests.guest_client,
+                False,
+                HTTPStatus.NOT_FOUND
+            ),
             (
                 '/posts/strange_URL/',  # Неизвестный адрес
                 PostsURLsTests.author_client,
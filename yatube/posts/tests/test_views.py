@@ -1,19 +1,28 @@
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
-from django.test import TestCase, Client, override_settings
+from django.db import connection, transaction
+from django.test import (
+    TestCase, TransactionTestCase, Client, override_settings
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.conf import settings
+from django.templatetags.static import static
 from django import forms
 
 import shutil
 import tempfile
 
 from time import sleep
+from unittest import mock
 
 
+from posts import thumbnails
+from posts.caching import generation
 from posts.models import Follow, Group, Post, Comment, User
+from posts.templatetags.post_fragments import fragment_key
 
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -181,6 +190,95 @@ class PostsViewsTests(TestCase):
                 )
                 self.assertEqual(len(response.context['page_obj']), 3)
 
+    @override_settings(KEYSET_PAGINATION_THRESHOLD=5)
+    def test_posts_keyset_paginator(self):
+        '''Тест паджинации по курсору для больших выборок.'''
+        reverses = (
+            reverse(
+                'posts:index'
+            ),
+            reverse(
+                'posts:group_list',
+                kwargs={'slug': PostsViewsTests.group.slug}
+            ),
+            reverse(
+                'posts:profile',
+                kwargs={'username': PostsViewsTests.user.username}
+            ),
+        )
+        for reverse_name in reverses:
+            with self.subTest(reverse_name=reverse_name):
+                first_page = PostsViewsTests.authorized_client.get(
+                    reverse_name
+                ).context['page_obj']
+                self.assertTrue(first_page.is_keyset)
+                self.assertFalse(first_page.has_previous())
+                self.assertEqual(
+                    len(first_page),
+                    settings.POSTS_PER_PAGE_LIMIT
+                )
+                second_page = PostsViewsTests.authorized_client.get(
+                    f'{reverse_name}?{first_page.next_query()}'
+                ).context['page_obj']
+                self.assertEqual(len(second_page), 3)
+                self.assertFalse(second_page.has_next())
+                self.assertEqual(
+                    [post.id for post in second_page],
+                    [post.id for post in PostsViewsTests.posts[2::-1]]
+                )
+                back_page = PostsViewsTests.authorized_client.get(
+                    f'{reverse_name}?{second_page.previous_query()}'
+                ).context['page_obj']
+                self.assertEqual(list(back_page), list(first_page))
+                # Старые ссылки с номером страницы продолжают работать
+                numbered_page = PostsViewsTests.authorized_client.get(
+                    reverse_name + '?page=2'
+                ).context['page_obj']
+                self.assertEqual(len(numbered_page), 3)
+
+    @override_settings(PAGINATOR_WINDOW=2)
+    def test_posts_paginator_window(self):
+        '''Тест окна номеров страниц вокруг текущей.'''
+        Post.objects.bulk_create(
+            Post(author=PostsViewsTests.user, group=PostsViewsTests.group)
+            for _ in range(50)
+        )
+        page_obj = PostsViewsTests.authorized_client.get(
+            reverse(
+                'posts:group_list',
+                kwargs={'slug': PostsViewsTests.group.slug}
+            ) + '?page=5'
+        ).context['page_obj']
+        self.assertEqual(page_obj.paginator.num_pages, 7)
+        self.assertEqual(list(page_obj.page_range), [3, 4, 5, 6, 7])
+
+    def test_posts_paginator_count_cache(self):
+        '''Тест кэширования количества записей паджинатора.'''
+        url = reverse(
+            'posts:group_list',
+            kwargs={'slug': PostsViewsTests.group.slug}
+        )
+        PostsViewsTests.authorized_client.get(url)
+        # Другой адрес, чтобы не получить страницу целиком из кэша
+        with CaptureQueriesContext(connection) as queries:
+            page_obj = PostsViewsTests.authorized_client.get(
+                url + '?page=1'
+            ).context['page_obj']
+        self.assertEqual(page_obj.paginator.count, len(self.posts) + 1)
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries)
+        )
+        # Новая запись сбрасывает закэшированное количество
+        Post.objects.create(
+            author=PostsViewsTests.user,
+            group=PostsViewsTests.group,
+            text='Новая запись',
+        )
+        page_obj = PostsViewsTests.authorized_client.get(
+            url
+        ).context['page_obj']
+        self.assertEqual(page_obj.paginator.count, len(self.posts) + 2)
+
     def test_posts_context(self):
         """Тест контекста в шаблонах index, group_list и profile."""
         reverses = (
@@ -251,6 +349,44 @@ class PostsViewsTests(TestCase):
             PostsViewsTests.comment.text
         )
 
+    @override_settings(COMMENTS_PER_PAGE=2)
+    def test_posts_comments_pages(self):
+        '''Тест порций комментариев на странице записи.'''
+        post = PostsViewsTests.full_post
+        for count in range(3):
+            Comment.objects.create(
+                text=f'Комментарий {count}',
+                author=PostsViewsTests.user,
+                post=post
+            )
+            sleep(0.01)
+        response = PostsViewsTests.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        )
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['Комментарий 2', 'Комментарий 1']
+        )
+        response = PostsViewsTests.authorized_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': post.id}),
+            {'after': response.context['comments_next']}
+        )
+        self.assertTemplateUsed(response, 'posts/includes/comment_list.html')
+        self.assertTemplateNotUsed(response, 'posts/post_detail.html')
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['Комментарий 0', PostsViewsTests.comment.text]
+        )
+        self.assertIsNone(response.context['comments_next'])
+        response = PostsViewsTests.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id}),
+            {'order': 'oldest'}
+        )
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            [PostsViewsTests.comment.text, 'Комментарий 0']
+        )
+
     def test_posts_context_creation_form(self):
         """
         Тест контекста в шаблоне post_create/post_edit.
@@ -323,23 +459,170 @@ class PostsViewsTests(TestCase):
             )
 
     def test_posts_cache_index(self):
-        """Проверка хранения и очищения кэша для index."""
-        # Посылаем запрос, тем самым кэшируя страницу
-        response = self.authorized_client.get(reverse('posts:index'))
-        check_1 = response.content
-        # Удаляем все посты
-        Post.objects.all().delete()
-        # Посылаем второй запрос и получаем результат из кэша
-        response = self.authorized_client.get(reverse('posts:index'))
-        check_2 = response.content
-        # Очищаем кэш
-        cache.clear()
-        # Посылаем третий запрос и получаем ответ без постов
-        response = self.authorized_client.get(reverse('posts:index'))
-        check_3 = response.content
+        """Проверка хранения и сброса кэша страниц при изменениях."""
+        reverses = (
+            reverse(
+                'posts:index'
+            ),
+            reverse(
+                'posts:group_list',
+                kwargs={'slug': PostsViewsTests.group.slug}
+            ),
+            reverse(
+                'posts:profile',
+                kwargs={'username': PostsViewsTests.user.username}
+            ),
+        )
+        for reverse_name in reverses:
+            with self.subTest(reverse_name=reverse_name):
+                # Посылаем запрос, тем самым кэшируя страницу
+                check_1 = self.authorized_client.get(reverse_name).content
+                # update() не посылает сигналов - страница остается в кэше
+                Post.objects.filter(
+                    id=PostsViewsTests.full_post.id
+                ).update(text='Незаметное изменение')
+                check_2 = self.authorized_client.get(reverse_name).content
+                # Сохранение записи сразу сбрасывает кэш страницы
+                post = Post.objects.get(id=PostsViewsTests.full_post.id)
+                post.text = f'Измененный текст {reverse_name}'
+                post.save()
+                check_3 = self.authorized_client.get(reverse_name).content
+
+                self.assertEqual(check_1, check_2)
+                self.assertNotEqual(check_2, check_3)
+                self.assertIn(post.text.encode(), check_3)
+
+    def test_posts_cache_follower_profile(self):
+        """Профиль подписчика сбрасывается при подписке."""
+        url = reverse(
+            'posts:profile',
+            kwargs={'username': PostsViewsTests.user.username}
+        )
+        self.assertIn(
+            'подписок: 0'.encode(), self.authorized_client.get(url).content
+        )
+        self.authorized_client.get(reverse(
+            'posts:profile_follow',
+            kwargs={'username': PostsViewsTests.author.username}
+        ))
+        self.assertIn(
+            'подписок: 1'.encode(), self.authorized_client.get(url).content
+        )
+
+    def test_posts_fragment_cache(self):
+        """Проверка кэша фрагментов записей и его сброса."""
+        url = reverse('posts:index')
+        self.authorized_client.get(url)
+        post = Post.objects.select_related('author', 'group').get(
+            id=PostsViewsTests.full_post.id
+        )
+        self.assertIsNotNone(cache.get(fragment_key(post, 'posts:index')))
+        # Изменение имени автора дает новый ключ и сбрасывает страницу
+        PostsViewsTests.user.first_name = 'Новое'
+        PostsViewsTests.user.last_name = 'Имя'
+        PostsViewsTests.user.save()
+        response = self.authorized_client.get(url)
+        self.assertIn('Новое Имя'.encode(), response.content)
 
-        self.assertEqual(check_1, check_2)
-        self.assertNotEqual(check_2, check_3)
+    def test_posts_cache_user_changes(self):
+        """Кэш страниц сбрасывается только при смене показываемых имен."""
+        display = generation('display')
+        user = User.objects.create_user(username='new_user')
+        user.set_password('new-password-1')
+        user.save()
+        self.assertEqual(generation('display'), display)
+        user.first_name = 'Имя'
+        user.save()
+        self.assertNotEqual(generation('display'), display)
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_posts_thumbnails(self):
+        """Заглушка до создания вариантов картинки, затем srcset."""
+        post = PostsViewsTests.full_post
+        url = reverse('posts:index')
+        placeholder = (
+            f'src="{static("img/none.png")}" width="960" height="339"'
+        ).encode()
+        response = self.authorized_client.get(url)
+        self.assertIn(placeholder, response.content)
+        self.assertIsNone(thumbnails.ready_variants(post.image))
+
+        thumbnails.schedule(post)
+        ready = thumbnails.ready_variants(post.image)
+        self.assertIsNotNone(ready)
+        response = self.authorized_client.get(url)
+        self.assertNotIn(placeholder, response.content)
+        self.assertIn(b'type="image/webp"', response.content)
+        for variants in ready.values():
+            self.assertEqual(
+                len(variants), len(settings.POST_IMAGE_WIDTHS)
+            )
+            for variant in variants:
+                self.assertIn(
+                    f'{variant.url} {variant.width}w'.encode(),
+                    response.content
+                )
+        self.assertTrue(ready['WEBP'][0].url.endswith('.webp'))
+
+    def test_posts_conditional_get(self):
+        '''Ответ 304 по ETag и Last-Modified до изменения страницы.'''
+        urls = (
+            reverse('posts:index'),
+            reverse(
+                'posts:group_list',
+                kwargs={'slug': PostsViewsTests.group.slug}
+            ),
+            reverse(
+                'posts:profile',
+                kwargs={'username': PostsViewsTests.user.username}
+            ),
+            reverse(
+                'posts:post_detail',
+                kwargs={'post_id': PostsViewsTests.full_post.id}
+            ),
+            reverse('posts:follow_index'),
+        )
+        etags = {}
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                etag = etags[url] = response['ETag']
+                last_modified = response['Last-Modified']
+                self.assertEqual(
+                    self.authorized_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    ).status_code,
+                    304
+                )
+                self.assertEqual(
+                    self.authorized_client.get(
+                        url, HTTP_IF_MODIFIED_SINCE=last_modified
+                    ).status_code,
+                    304
+                )
+                # Другой пользователь видит другую страницу
+                self.assertEqual(
+                    self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+                    302 if url == urls[-1] else 200
+                )
+        # Новый комментарий меняет страницу записи
+        Comment.objects.create(
+            text='Новый комментарий',
+            author=PostsViewsTests.user,
+            post=PostsViewsTests.full_post
+        )
+        response = self.authorized_client.get(
+            urls[3], HTTP_IF_NONE_MATCH=etags[urls[3]]
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_posts_conditional_get_skips_queries(self):
+        '''Ответ 304 не выполняет запросов к базе.'''
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
 
     def test_posts_follow(self):
         '''Проверка функции подписки/отписки.'''
@@ -387,10 +670,37 @@ class PostsViewsTests(TestCase):
             reverses[0]
         ).context['page_obj']
         self.assertEqual(len(response), 0)
-        # Подписались
-        PostsViewsTests.authorized_client.get(reverses[1])
+        # Подписались. TestCase не фиксирует транзакцию, поэтому
+        # заполнение ленты после фиксации выполняется сразу
+        with mock.patch(
+            'django.db.transaction.on_commit', lambda func: func()
+        ):
+            PostsViewsTests.authorized_client.get(reverses[1])
         # Проверили, что пост автора появлися в feed
         response = PostsViewsTests.authorized_client.get(
             reverses[0]
         ).context['page_obj']
         self.assertEqual(len(response), 1)
+
+
+class PostsCacheCommitTests(TransactionTestCase):
+    '''Сброс кэша после фиксации транзакции.'''
+
+    def setUp(self):
+        cache.clear()
+
+    def test_posts_cache_bump_on_commit(self):
+        """
+        Поколение сдвигается еще раз после фиксации: страница,
+        закэшированная до нее, устаревает.
+        """
+        user = User.objects.create_user(username='follower')
+        author = User.objects.create_user(username='author')
+        with transaction.atomic():
+            Follow.objects.create(user=user, author=author)
+            # Такое поколение увидел бы параллельный запрос,
+            # пока подписка еще не зафиксирована
+            before_commit = generation(f'author:{author.username}')
+        self.assertNotEqual(
+            generation(f'author:{author.username}'), before_commit
+        )
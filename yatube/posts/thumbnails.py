@@ -0,0 +1,165 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from core import jobs
+
+from .caching import bump, post_scopes
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def _thumbnail_options(source, options):
+    '''Опции миниатюры так же, как их дополняет sorl-thumbnail.'''
+    options = dict(options)
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', default.backend._get_format(source))
+    for key, value in default.backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in default.backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def lookup(image, geometry, **options):
+    '''
+    Готовая миниатюра изображения или None, если ее еще нет.
+    Только читает хранилище ключей sorl-thumbnail и не трогает Pillow.
+    '''
+    if not image:
+        return None
+    source = ImageFile(image)
+    name = default.backend._get_thumbnail_filename(
+        source, geometry, _thumbnail_options(source, options)
+    )
+    return default.kvstore.get(ImageFile(name, default.storage))
+
+
+def variants():
+    '''
+    Варианты картинки записи: (формат, ширина, геометрия, опции)
+    для каждой ширины из POST_IMAGE_WIDTHS и формата из POST_IMAGE_FORMATS.
+    '''
+    width, height = settings.POST_IMAGE_SIZE
+    for image_format in settings.POST_IMAGE_FORMATS:
+        for variant_width in settings.POST_IMAGE_WIDTHS:
+            variant_height = round(variant_width * height / width)
+            options = dict(settings.POST_IMAGE_OPTIONS, format=image_format)
+            yield (
+                image_format,
+                variant_width,
+                f'{variant_width}x{variant_height}',
+                options,
+            )
+
+
+def ready_variants(image):
+    '''
+    Готовые варианты картинки по форматам: {формат: [миниатюры по
+    возрастанию ширины]}. None, если хотя бы одного варианта еще нет.
+    '''
+    result = {}
+    for image_format, _, geometry, options in variants():
+        thumbnail = lookup(image, geometry, **options)
+        if thumbnail is None:
+            return None
+        result.setdefault(image_format, []).append(thumbnail)
+    return result
+
+
+def generate(image):
+    '''
+    Создание недостающих вариантов картинки.
+    Возвращает количество созданных.
+    '''
+    created = 0
+    for _, _, geometry, options in variants():
+        if lookup(image, geometry, **options) is None:
+            default.backend.get_thumbnail(image, geometry, **options)
+            created += 1
+    return created
+
+
+def refresh(post_id, image_name):
+    '''
+    Создание недостающих вариантов картинки записи и сброс страниц,
+    где она показывалась заглушкой. Возвращает количество созданных.
+    '''
+    post = Post.objects.select_related('author').filter(
+        id=post_id, image=image_name
+    ).first()
+    # Запись удалили или сменили картинку, пока задача ждала очереди
+    if post is None:
+        return 0
+    created = generate(post.image)
+    if created:
+        # Новое время изменения дает записи новый ключ фрагмента
+        Post.objects.filter(id=post_id).update(updated=timezone.now())
+        bump(*post_scopes(post))
+    return created
+
+
+def _run(post_id, image_name):
+    try:
+        refresh(post_id, image_name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры записи %s', post_id)
+    finally:
+        with _pending_lock:
+            _pending.discard((post_id, image_name))
+        close_old_connections()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails'
+            )
+        return _executor
+
+
+def schedule(post):
+    '''
+    Постановка миниатюр записи в очередь фонового пула, при JOB_QUEUE -
+    в очередь задач 'thumbnails'. При THUMBNAIL_WORKERS = 0 миниатюры
+    создаются сразу.
+    '''
+    if not post.image:
+        return
+    if settings.JOB_QUEUE:
+        jobs.enqueue(
+            refresh,
+            post.id,
+            post.image.name,
+            queue='thumbnails',
+            key=f'thumbnails:{post.id}:{post.image.name}'
+        )
+        return
+    job = (post.id, post.image.name)
+    with _pending_lock:
+        if job in _pending:
+            return
+        _pending.add(job)
+    if settings.THUMBNAIL_WORKERS:
+        _get_executor().submit(_run, *job)
+    else:
+        _run(*job)
@@ -1,6 +1,10 @@
-from django.views.decorators.cache import cache_page
 from django.urls import path
 from . import views
+from .caching import (
+    conditional_page,
+    generation_cache_page,
+    post_page_scopes
+)
 
 
 app_name = 'posts'
@@ -8,24 +12,39 @@ app_name = 'posts'
 urlpatterns = [
     path(
         '',
-        cache_page(20)(views.IndexView.as_view()),
+        conditional_page('index')(
+            generation_cache_page('index')(views.IndexView.as_view())
+        ),
         name='index'
     ),
     path(
         'group/<slug:slug>/',
-        views.GroupPostsView.as_view(),
+        conditional_page('group:{slug}')(
+            generation_cache_page('group:{slug}')(
+                views.GroupPostsView.as_view()
+            )
+        ),
         name='group_list'
     ),
     path(
         'profile/<str:username>/',
-        views.ProfileView.as_view(),
+        conditional_page('author:{username}')(
+            generation_cache_page('author:{username}')(
+                views.ProfileView.as_view()
+            )
+        ),
         name='profile'
     ),
     path(
         'posts/<int:post_id>/',
-        views.PostDetailView.as_view(),
+        conditional_page(post_page_scopes)(views.PostDetailView.as_view()),
         name='post_detail'
     ),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.PostCommentsView.as_view(),
+        name='post_comments'
+    ),
     path(
         'posts/<int:post_id>/edit/',
         views.PostEditView.as_view(),
@@ -41,9 +60,21 @@ urlpatterns = [
         views.AddCommentView.as_view(),
         name='add_comment'
     ),
+    path(
+        'search/',
+        views.SearchView.as_view(),
+        name='search'
+    ),
+    path(
+        'export/',
+        views.ExportView.as_view(),
+        name='export'
+    ),
     path(
         'follow/',
-        views.FollowIndexView.as_view(),
+        conditional_page('index', 'feed:{user}')(
+            views.FollowIndexView.as_view()
+        ),
         name='follow_index'
     ),
     path(
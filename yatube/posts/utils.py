@@ -1,11 +1,230 @@
+from hashlib import md5
+
+from django.conf import settings
 from django.core import paginator
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from django.utils.http import urlencode
+
+from .caching import generation
 
 
 def pagination(self, posts):
+    page_obj = keyset_pagination(self, posts)
+    if page_obj is not None:
+        return page_obj
     page = self.request.GET.get("page")
-    pagination = paginator.Paginator(posts, self.paginate_by)
+    pagination = WindowedPaginator(posts, self.paginate_by)
     try:
         page_obj = pagination.page(page)
     except (paginator.PageNotAnInteger, paginator.EmptyPage):
         page_obj = pagination.page(1)
     return page_obj
+
+
+def cached_count(queryset):
+    '''
+    COUNT(*) выборки из кэша. Ключ включает поколение "posts",
+    которое сдвигается при создании, изменении и удалении записей
+    и подписок (posts.signals) и после заполнения лент (posts.feed).
+    '''
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    digest = md5(f'{sql}{params}'.encode()).hexdigest()
+    key = f'count:{generation("posts")}:{digest}'
+    count = cache.get(key)
+    if count is None:
+        if queryset.query.annotations and queryset.query.group_by is None:
+            # Аннотации-поля (порядок ленты подписок) не меняют количество
+            # строк, но с ними COUNT(*) строится через подзапрос с GROUP BY
+            queryset = queryset.all()
+            queryset.query.annotations.clear()
+        count = queryset.count()
+        cache.set(key, count, settings.POSTS_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+class WindowedPage(paginator.Page):
+    '''Страница с ограниченным окном номеров вокруг текущей.'''
+
+    @property
+    def page_range(self):
+        window = settings.PAGINATOR_WINDOW
+        return range(
+            max(1, self.number - window),
+            min(self.paginator.num_pages, self.number + window) + 1
+        )
+
+
+class WindowedPaginator(paginator.Paginator):
+    '''
+    Нумерованный паджинатор с закэшированным количеством записей
+    и окном номеров страниц вместо полного page_range.
+    '''
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list)
+
+    def _get_page(self, *args, **kwargs):
+        return WindowedPage(*args, **kwargs)
+
+
+def encode_cursor(post):
+    '''Курсор записи в виде строки "<pub_date>,<id>".'''
+    return f'{post.pub_date.isoformat()},{post.id}'
+
+
+def decode_cursor(value):
+    '''Разбор курсора; None, если курсор испорчен.'''
+    pub_date, _, pk = (value or '').rpartition(',')
+    try:
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except ValueError:
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+def load_more(queryset, per_page, cursor=None, ascending=False):
+    '''
+    Порция объектов для подгрузки "показать еще" по курсору
+    (pub_date, id). Возвращает объекты и курсор следующей порции
+    (None, если объектов больше нет).
+    '''
+    if cursor is not None:
+        pub_date, pk = cursor
+        if ascending:
+            queryset = queryset.filter(
+                Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, id__gt=pk)
+            )
+        else:
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk)
+            )
+    ordering = ('pub_date', 'id') if ascending else ('-pub_date', '-id')
+    rows = list(queryset.order_by(*ordering)[:per_page + 1])
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1])
+    return rows, next_cursor
+
+
+class KeysetPage(paginator.Page):
+    '''Страница, полученная по курсору, без номера и общего количества.'''
+    is_keyset = True
+
+    def __init__(self, object_list, paginator, has_previous, has_next):
+        super().__init__(object_list, None, paginator)
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self.object_list)}>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def next_query(self):
+        '''Параметры ссылки на более старые записи.'''
+        return urlencode({'before': encode_cursor(self.object_list[-1])})
+
+    def previous_query(self):
+        '''Параметры ссылки на более новые записи.'''
+        return urlencode({'after': encode_cursor(self.object_list[0])})
+
+
+class KeysetPaginator(paginator.Paginator):
+    '''
+    Паджинатор по курсору (pub_date, id) в порядке -pub_date.
+    Не выполняет ни COUNT(*), ни OFFSET: каждая страница -
+    это диапазон по индексу с LIMIT per_page + 1. fields - поля
+    выборки с теми же значениями, что pub_date и id записи, по которым
+    есть индекс (например, поля ленты подписок).
+    '''
+
+    def __init__(self, *args, fields=('pub_date', 'id'), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields = fields
+
+    def _range(self, cursor, lookup):
+        date_field, id_field = self.fields
+        pub_date, pk = cursor
+        return Q(**{f'{date_field}__{lookup}': pub_date}) | Q(**{
+            date_field: pub_date, f'{id_field}__{lookup}': pk
+        })
+
+    def page_by_cursor(self, before=None, after=None):
+        posts = self.object_list
+        limit = self.per_page + 1
+        date_field, id_field = self.fields
+        if after is not None:
+            rows = list(posts.filter(self._range(after, 'gt')).order_by(
+                date_field, id_field
+            )[:limit])
+            if len(rows) == limit:
+                rows = rows[:self.per_page][::-1]
+                return KeysetPage(rows, self, True, True)
+            # Новее записей на целую страницу нет - это первая страница
+            before = None
+        if before is not None:
+            posts = posts.filter(self._range(before, 'lt'))
+        rows = list(posts.order_by(f'-{date_field}', f'-{id_field}')[:limit])
+        has_next = len(rows) == limit
+        return KeysetPage(
+            rows[:self.per_page], self, before is not None, has_next
+        )
+
+
+def keyset_pagination(self, posts):
+    '''
+    Страница по курсору для представлений с keyset_pagination = True.
+    Возвращает None, если подходит обычный нумерованный паджинатор:
+    запрошен ?page=N или записей меньше KEYSET_PAGINATION_THRESHOLD.
+    '''
+    if not getattr(self, 'keyset_pagination', False):
+        return None
+    before = decode_cursor(self.request.GET.get('before'))
+    after = decode_cursor(self.request.GET.get('after'))
+    if before is None and after is None:
+        if 'page' in self.request.GET:
+            return None
+        if cached_count(posts) < settings.KEYSET_PAGINATION_THRESHOLD:
+            return None
+    pagination = KeysetPaginator(
+        posts,
+        self.paginate_by,
+        fields=getattr(self, 'keyset_fields', ('pub_date', 'id'))
+    )
+    page_obj = pagination.page_by_cursor(before=before, after=after)
+    if not page_obj.object_list and (before or after):
+        page_obj = pagination.page_by_cursor()
+    return page_obj
+
+
+class KeysetPaginationMixin:
+    '''Подключает паджинацию по курсору к ListView.'''
+    keyset_pagination = True
+    paginator_class = WindowedPaginator
+
+    def paginate_queryset(self, queryset, page_size):
+        page_obj = keyset_pagination(self, queryset)
+        if page_obj is None:
+            return super().paginate_queryset(queryset, page_size)
+        return (
+            page_obj.paginator,
+            page_obj,
+            page_obj.object_list,
+            page_obj.has_other_pages()
+        )
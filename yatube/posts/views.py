@@ -1,12 +1,23 @@
 from .models import Follow, Post, Group, Comment, User
+from .export import export_response
 from .forms import PostForm, CommentForm
-from .utils import pagination
+from .search import search_posts
+from .utils import (
+    KeysetPaginationMixin,
+    WindowedPaginator,
+    decode_cursor,
+    load_more,
+    pagination
+)
 
 
 from django.urls import reverse
+from django.db.models import F
 from django.conf import settings
 from django.contrib.auth.views import redirect_to_login
-from django.shortcuts import redirect
+from django.http import Http404, HttpResponseRedirect
+from django.utils.http import urlencode
+from django.shortcuts import redirect, render
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic import (
     ListView,
@@ -16,25 +27,30 @@ from django.views.generic import (
     View
 )
 
+from core.writer import write
+
 
-class IndexView(ListView):
+class IndexView(KeysetPaginationMixin, ListView):
     '''Класс-представление главной страницы.'''
+    replica_reads = True
     paginate_by = settings.POSTS_PER_PAGE_LIMIT
-    model = Post
+    queryset = Post.objects.select_related('author', 'group')
     template_name = 'posts/index.html'
 
 
 class GroupPostsView(DetailView):
     '''Класс-представление страницы группы.'''
+    replica_reads = True
     template_name = 'posts/group_list.html'
     model = Group
     slug_url_kwarg = 'slug'
     paginate_by = settings.POSTS_PER_PAGE_LIMIT
+    keyset_pagination = True
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        group = self.get_object()
-        posts = group.posts.all()
+        group = self.object
+        posts = group.posts.select_related('author', 'group')
         page_obj = pagination(self, posts)
         context['page_obj'] = page_obj
         context['group'] = group
@@ -43,17 +59,19 @@ class GroupPostsView(DetailView):
 
 class ProfileView(DetailView):
     '''Класс-представление страницы пользователя.'''
+    replica_reads = True
     template_name = 'posts/profile.html'
-    model = User
+    queryset = User.objects.select_related('stats')
     slug_field = 'username'
     slug_url_kwarg = 'username'
     paginate_by = settings.POSTS_PER_PAGE_LIMIT
+    keyset_pagination = True
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        author = self.get_object()
+        author = self.object
         user = self.request.user
-        posts = author.posts.all()
+        posts = author.posts.select_related('author', 'group')
         page_obj = pagination(self, posts)
         following = False
         if user.is_authenticated:
@@ -69,7 +87,8 @@ class ProfileView(DetailView):
 
 class PostDetailView(DetailView):
     '''Класс-представление страницы записи.'''
-    model = Post
+    replica_reads = True
+    queryset = Post.objects.select_related('author__stats', 'group')
     template_name = 'posts/post_detail.html'
     pk_url_kwarg = 'post_id'
     context_object_name = 'post'
@@ -77,12 +96,43 @@ class PostDetailView(DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         form = CommentForm()
-        comments = Comment.objects.filter(post__id=self.kwargs['post_id'])
         context['form'] = form
-        context['comments'] = comments
+        context.update(comments_context(self.request, self.kwargs['post_id']))
         return context
 
 
+def comments_context(request, post_id):
+    '''Порция комментариев записи с авторами и курсор следующей порции.'''
+    order = request.GET.get('order')
+    if order != 'oldest':
+        order = 'newest'
+    comments, comments_next = load_more(
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        settings.COMMENTS_PER_PAGE,
+        cursor=decode_cursor(request.GET.get('after')),
+        ascending=order == 'oldest'
+    )
+    return {
+        'post_id': post_id,
+        'comments': comments,
+        'comments_next': comments_next,
+        'comments_order': order,
+    }
+
+
+class PostCommentsView(View):
+    '''Класс-представление следующей порции комментариев записи.'''
+
+    def get(self, request, *args, **kwargs):
+        if not Post.objects.filter(id=self.kwargs['post_id']).exists():
+            raise Http404
+        return render(
+            request,
+            'posts/includes/comment_list.html',
+            comments_context(request, self.kwargs['post_id'])
+        )
+
+
 class PostCreateView(LoginRequiredMixin, CreateView):
     '''Класс-представление создания записи.'''
     template_name = 'posts/post_create.html'
@@ -109,9 +159,11 @@ class PostCreateView(LoginRequiredMixin, CreateView):
 
     def form_valid(self, form):
         post_object = form.save(commit=False)
-        post_object.author = User.objects.get(username=self.request.user)
-        post_object.save()
-        return super().form_valid(form)
+        post_object.author = self.request.user
+        # Запись и счетчики автора сохраняются вместе
+        write(post_object.save)
+        self.object = post_object
+        return HttpResponseRedirect(self.get_success_url())
 
     def get_success_url(self):
         return reverse(
@@ -143,6 +195,11 @@ class PostEditView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
             self.get_redirect_field_name()
         )
 
+    def form_valid(self, form):
+        self.object = form.save(commit=False)
+        write(self.object.save)
+        return HttpResponseRedirect(self.get_success_url())
+
     def get_success_url(self):
         return reverse('posts:post_detail', kwargs={'post_id': self.object.id})
 
@@ -161,8 +218,10 @@ class AddCommentView(LoginRequiredMixin, CreateView):
         comment = form.save(commit=False)
         comment.author = self.request.user
         comment.post = Post.objects.get(id=self.kwargs['post_id'])
-        comment.save()
-        return super().form_valid(form)
+        # Комментарий и счетчик комментариев записи сохраняются вместе
+        write(comment.save)
+        self.object = comment
+        return HttpResponseRedirect(self.get_success_url())
 
     def get_success_url(self):
         return reverse(
@@ -171,14 +230,52 @@ class AddCommentView(LoginRequiredMixin, CreateView):
         )
 
 
-class FollowIndexView(LoginRequiredMixin, ListView):
+class FollowIndexView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     '''Класс-представление страницы подписок.'''
+    replica_reads = True
     paginate_by = settings.POSTS_PER_PAGE_LIMIT
     model = Post
     template_name = 'posts/follow.html'
+    keyset_fields = ('feed_pub_date', 'feed_post_id')
 
     def get_queryset(self):
-        return Post.objects.filter(author__following__user=self.request.user)
+        # Порядок и курсор по полям ленты: для них есть индекс
+        # (user, pub_date, post), для полей записи нужна сортировка
+        return Post.objects.filter(
+            feed_items__user=self.request.user
+        ).annotate(
+            feed_pub_date=F('feed_items__pub_date'),
+            feed_post_id=F('feed_items__post_id'),
+        ).order_by(
+            '-feed_pub_date', '-feed_post_id'
+        ).select_related('author', 'group')
+
+
+class SearchView(ListView):
+    '''Класс-представление полнотекстового поиска по записям.'''
+    paginate_by = settings.POSTS_PER_PAGE_LIMIT
+    paginator_class = WindowedPaginator
+    template_name = 'posts/search.html'
+
+    def get_queryset(self):
+        self.query = self.request.GET.get('q', '').strip()
+        return search_posts(
+            Post.objects.select_related('author', 'group'),
+            self.query
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.query
+        context['page_query'] = urlencode({'q': self.query}) + '&'
+        return context
+
+
+class ExportView(LoginRequiredMixin, View):
+    '''Класс-представление выгрузки своих записей и комментариев.'''
+
+    def get(self, request, *args, **kwargs):
+        return export_response(request.user, request.GET.get('format'))
 
 
 class ProfileFollow(LoginRequiredMixin, View):
@@ -186,7 +283,8 @@ class ProfileFollow(LoginRequiredMixin, View):
         author = User.objects.get(username=self.kwargs['username'])
         user = request.user
         if user != author:
-            Follow.objects.get_or_create(
+            write(
+                Follow.objects.get_or_create,
                 user=user,
                 author=author
             )
@@ -197,8 +295,8 @@ class ProfileUnfollow(LoginRequiredMixin, View):
     def get(self, request, *args, **kwargs):
         author = User.objects.get(username=self.kwargs['username'])
         user = request.user
-        Follow.objects.filter(
+        write(Follow.objects.filter(
             user=user,
             author=author
-        ).delete()
+        ).delete)
         return redirect('posts:profile', username=self.kwargs['username'])
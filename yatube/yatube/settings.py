@@ -1,4 +1,8 @@
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 from dotenv import load_dotenv
 
@@ -34,11 +38,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ServerTimingMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -72,9 +78,71 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Постоянные соединения: PRAGMA выполняются один раз
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', 60)),
+        # Сколько секунд ждать, пока база занята другим пишущим
+        'OPTIONS': {'timeout': 20},
     }
 }
 
+# Реплики для чтения - пути через запятую в DATABASE_REPLICAS. Локально
+# это копии основной базы, которые обновляет команда sync_replicas
+REPLICA_DATABASES = []
+for number, path in enumerate(
+    filter(None, os.getenv('DATABASE_REPLICAS', '').split(','))
+):
+    REPLICA_DATABASES.append(f'replica{number}')
+    DATABASES[f'replica{number}'] = dict(
+        DATABASES['default'], NAME=path, TEST={'MIRROR': 'default'}
+    )
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+REPLICA_LAG_SECONDS = 10  # Сколько секунд после записи читать с основной базы (cookie автора и страницы с изменениями)
+
+REPLICA_COOKIE = 'read_primary'  # Cookie, по которой автор изменений читает с основной базы
+
+# Настройка каждого соединения с SQLite (core.signals): WAL - читатели
+# не ждут пишущих, synchronous=NORMAL безопасен в режиме WAL
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+SQLITE_WRITE_RETRIES = 5  # Сколько раз повторять транзакцию записи, если база занята дольше timeout
+
+SQLITE_RETRY_BACKOFF = 0.05  # Пауза перед первым повтором в секундах, дальше растет вдвое
+
+WRITE_QUEUE = bool(int(os.getenv('WRITE_QUEUE', 0)))  # Записи из запросов через один пишущий процесс run_writer пачками (core.writer), 0 - каждая своей транзакцией
+
+WRITE_QUEUE_LOCATION = os.getenv('WRITE_QUEUE_LOCATION', os.path.join(BASE_DIR, 'writes.sqlite3'))  # Файл SQLite с очередью записей, общий для процессов сервера и run_writer
+
+WRITE_QUEUE_BATCH_SIZE = 100  # Сколько записей фиксировать одной транзакцией
+
+WRITE_QUEUE_DELAY = 0.002  # Пауза в секундах между проверками очереди (run_writer) и ответа (запрос)
+
+WRITE_QUEUE_TIMEOUT = 30  # Сколько секунд запрос ждет фиксации своей записи
+
+JOB_QUEUE = bool(int(os.getenv('JOB_QUEUE', 0)))  # Побочные действия записи (ленты, миниатюры, почта) задачами в базе для run_jobs, 0 - в запросе после фиксации транзакции
+
+# Очереди задач и сколько задач каждой выполняется одновременно
+# во всех обработчиках run_jobs
+JOB_QUEUES = {
+    'default': 2,
+    'feed': 2,
+    'thumbnails': 1,
+    'mail': 1,
+}
+
+JOB_MAX_ATTEMPTS = 5  # Сколько раз запускать задачу, прежде чем отметить ее неудачной
+
+JOB_RETRY_DELAY = 10  # Пауза в секундах перед повтором задачи, дальше растет вдвое
+
+JOB_LEASE_SECONDS = 300  # Через сколько секунд задача без результата считается брошенной и запускается заново
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -115,19 +183,88 @@ EMPTY = '-пусто-'  # Значение для пустых полей
 
 POSTS_PER_PAGE_LIMIT = 10  # Количество записей на одной странице
 
+COMMENTS_PER_PAGE = 20  # Количество комментариев в одной порции на странице записи
+
+KEYSET_PAGINATION_THRESHOLD = 1000  # С какого количества записей включается паджинация по курсору
+
+PAGINATOR_WINDOW = 3  # Сколько номеров страниц показывать по обе стороны от текущей
+
+POSTS_COUNT_CACHE_TIMEOUT = 60 * 60  # Время хранения количества записей в кэше
+
+PAGE_CACHE_TIMEOUT = None  # Страницы хранятся в кэше до изменения их содержимого
+
+POST_FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24  # Время хранения отрисованной записи в кэше
+
+USER_CACHE_TIMEOUT = 60 * 60 * 24  # Время хранения пользователя запроса в кэше (core.auth)
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'  # Сессии читаются из кэша, из базы - только при промахе
+
+FEED_BATCH_SIZE = 500  # Размер пачки при заполнении и очистке лент подписок
+
+EXPORT_CHUNK_SIZE = 500  # Сколько строк читать из базы за раз при выгрузке данных пользователя
+
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 2))  # Потоки фонового создания миниатюр, 0 - создавать сразу после сохранения
+
+POST_IMAGE_SIZE = (960, 339)  # Размер картинки записи на самой широкой странице
+
+POST_IMAGE_WIDTHS = (320, 640, 960)  # Ширины вариантов картинки для srcset
+
+POST_IMAGE_FORMATS = ('WEBP', 'JPEG')  # Форматы вариантов, последний - для браузеров без WebP
+
+POST_IMAGE_OPTIONS = {'crop': 'center', 'upscale': True, 'quality': 80}  # Опции sorl-thumbnail для вариантов
+
+POST_IMAGE_SIZES = '(min-width: 992px) 960px, 100vw'  # Атрибут sizes картинки записи
+
+SERVER_TIMING_SAMPLE_RATE = float(os.getenv('SERVER_TIMING_SAMPLE_RATE', 0))  # Доля запросов с заголовком Server-Timing и строкой в журнале core.timing, 0 - выключено
+
 LOGIN_URL = 'users:login'  # Ссылка на логин
 
 LOGIN_REDIRECT_URL = 'posts:index'  # Редирект после логина
 
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'  # Подключение эмулятора почтового сервера
+EMAIL_BACKEND = 'core.mail.QueuedEmailBackend'  # Письма отправляются задачей (core.jobs) через JOB_EMAIL_BACKEND
+
+JOB_EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'  # Подключение эмулятора почтового сервера
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')  # Путь для сохранения писем от почтового сервера
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'  # Переопределяем вью-функцию для обработки ошибки 403
 
-# Добавляем кэширование
+# Добавляем кэширование: общий для всех процессов файл SQLite
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', os.path.join(BASE_DIR, 'cache.sqlite3'))
+
+# Тесты (manage.py test и pytest) получают свои кэш, очередь записей и
+# медиа во временном каталоге: cache.clear() в тестах не должен очищать
+# кэш сайта, а загруженные картинки и миниатюры - оставаться в проекте
+if sys.argv[1:2] == ['test'] or 'pytest' in sys.modules:
+    TEST_DIRECTORY = tempfile.mkdtemp(prefix='yatube-tests-')
+    atexit.register(shutil.rmtree, TEST_DIRECTORY, True)
+    CACHE_LOCATION = os.path.join(TEST_DIRECTORY, 'cache.sqlite3')
+    WRITE_QUEUE_LOCATION = os.path.join(TEST_DIRECTORY, 'writes.sqlite3')
+    MEDIA_ROOT = os.path.join(TEST_DIRECTORY, 'media')
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.sqlite_cache.SQLiteCache',
+        'LOCATION': CACHE_LOCATION,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+        },
     }
 }
+
+# Строки замеров ServerTimingMiddleware выводятся в консоль
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}